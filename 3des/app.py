@@ -1,39 +1,380 @@
-from flask import Flask, render_template, request, jsonify
-from Crypto.Cipher import DES3
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from Crypto.Cipher import AES, ChaCha20_Poly1305, DES3
 from Crypto.Util.Padding import pad, unpad
+from werkzeug.utils import secure_filename
 from base64 import b64encode, b64decode
+from collections import OrderedDict
+import hashlib
+import io
 import os
+import struct
+import threading
+import time
 
 app = Flask(__name__, template_folder='.')
 
+# Streaming mode reads and writes this many bytes at a time (a multiple of the block size)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# --- Key derivation ---
+# With a KDF the output starts with a header so decryption can re-derive the key:
+#   v1 (3DES-CBC): magic "3DKF" | 1 | kdf id | cost | salt(16) | IV | ciphertext
+#   v2 (AEAD):     magic "3DKF" | 2 | mode | kdf id | cost | salt(16) | nonce(12) | ciphertext | tag(16)
+# cost is the PBKDF2 iteration count or log2(N) for scrypt. In v2 the whole
+# header is authenticated as associated data. Output without the magic is
+# the original format (keys padded/truncated to 8 bytes each).
+KDF_MAGIC = b'3DKF'
+KDF_VERSION = 1
+KDF_HEADER = struct.Struct('>4sBBI16s')
+AEAD_VERSION = 2
+AEAD_HEADER = struct.Struct('>4sBBBI16s')
+KDF_IDS = {'none': 0, 'pbkdf2': 1, 'scrypt': 2}
+KDF_COSTS = {1: 310000, 2: 15}
+# The cost comes from an unauthenticated header, so decryption accepts at
+# most what this server writes itself; anything higher would let a caller
+# buy seconds of CPU per request. Raise both together.
+KDF_MAX_COSTS = dict(KDF_COSTS)
+# scrypt needs 128 * r * N bytes (r=8), so N may be at most 2**17 here
+SCRYPT_MAXMEM = 256 * 1024 * 1024
+if 128 * 8 << KDF_MAX_COSTS[2] >= SCRYPT_MAXMEM:
+    raise RuntimeError("KDF_MAX_COSTS allows scrypt above SCRYPT_MAXMEM")
+DEFAULT_KDF = 'pbkdf2'
+
+# Cipher modes; the AEAD ones use a 256-bit key and detect tampering
+MODES = {'3des-cbc': 0, 'aes-gcm': 1, 'chacha20-poly1305': 2}
+DEFAULT_MODE = '3des-cbc'
+AEAD_KEY_SIZE = 32
+AEAD_NONCE_SIZE = 12
+AEAD_TAG_SIZE = 16
+MAX_BATCH_ITEMS = 1000
+# Each distinct key set in a batch costs a full KDF run (about 0.3 s), so a
+# batch may only bring this many; items past the limit get an error
+MAX_BATCH_KEY_SETS = 4
+
+class DerivedKeyCache:
+    # Bounded LRU of derived keys with a time-to-live, keyed by a SHA-256
+    # digest of (passwords, salt, kdf, cost) so the passwords themselves
+    # are never kept. Also remembers the salt last used per password set,
+    # so one session encrypting many messages derives its key only once.
+    # With sliding=True the ttl is an idle timeout, renewed on every hit.
+    def __init__(self, max_entries=1024, ttl=600, sliding=False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sliding = sliding
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, digest):
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self.entries[digest]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(digest)
+            if self.sliding:
+                self.entries[digest] = (entry[0], time.monotonic() + self.ttl)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, digest, value):
+        with self.lock:
+            self.entries[digest] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+derived_keys = DerivedKeyCache()
+
+def xor_block(*blocks):
+    value = 0
+    for block in blocks:
+        value ^= int.from_bytes(block, 'big')
+    return value.to_bytes(DES3.block_size, 'big')
+
+class KeySchedule:
+    # A 3DES key checked and parity-adjusted once, plus one encrypting and
+    # one decrypting DES3.new CBC object that are reused for every whole
+    # message, so the cipher setup runs once per key, not once per call.
+    # A CBC object continues from its last ciphertext block (its state);
+    # XORing the first block with state ^ iv makes it behave exactly like
+    # a fresh cipher started with iv. Only the public DES3 API is used.
+    # Safe to share between threads: a busy object is never waited for,
+    # the call simply gets a fresh cipher.
+    def __init__(self, key):
+        self.key = DES3.adjust_key_parity(key)  # rejects degenerate keys
+        self.encrypter = self.decrypter = None  # (cipher, state)
+        self.encrypt_lock = threading.Lock()
+        self.decrypt_lock = threading.Lock()
+    
+    def cbc(self, iv=None):
+        # Fresh cipher, for streams fed chunk by chunk
+        if iv is None:
+            iv = os.urandom(DES3.block_size)
+        return DES3.new(self.key, DES3.MODE_CBC, iv)
+    
+    def encrypt(self, data, iv):
+        # CBC-encrypt one whole (padded) message
+        size = DES3.block_size
+        if not data or len(data) % size or not self.encrypt_lock.acquire(blocking=False):
+            return self.cbc(iv).encrypt(data)
+        try:
+            if self.encrypter is None:
+                self.encrypter = (DES3.new(self.key, DES3.MODE_CBC, iv), iv)
+            cipher, state = self.encrypter
+            encrypted = cipher.encrypt(xor_block(data[:size], state, iv) + data[size:])
+            self.encrypter = (cipher, encrypted[-size:])
+            return encrypted
+        finally:
+            self.encrypt_lock.release()
+    
+    def decrypt(self, data, iv):
+        # CBC-decrypt one whole message (padding is left on)
+        size = DES3.block_size
+        if not data or len(data) % size or not self.decrypt_lock.acquire(blocking=False):
+            return self.cbc(iv).decrypt(data)
+        try:
+            if self.decrypter is None:
+                self.decrypter = (DES3.new(self.key, DES3.MODE_CBC, iv), iv)
+            cipher, state = self.decrypter
+            decrypted = cipher.decrypt(data)
+            self.decrypter = (cipher, data[-size:])
+            return xor_block(decrypted[:size], state, iv) + decrypted[size:]
+        finally:
+            self.decrypt_lock.release()
+
+# Prepared keys per key triple; idle ones expire after 5 minutes
+key_schedules = DerivedKeyCache(max_entries=256, ttl=300, sliding=True)
+
+def des3_schedule(key):
+    digest = hashlib.sha256(b'des3' + key).digest()
+    schedule = key_schedules.get(digest)
+    if schedule is None:
+        schedule = KeySchedule(key)
+        key_schedules.put(digest, schedule)
+    return schedule
+
+def des3_cbc(key, iv=None):
+    return des3_schedule(key).cbc(iv)
+
+def des3_encrypt(key, data):
+    # IV + CBC ciphertext of already padded data
+    iv = os.urandom(DES3.block_size)
+    return iv + des3_schedule(key).encrypt(data, iv)
+
+def des3_decrypt(key, data):
+    # Inverse of des3_encrypt (padding is left on)
+    return des3_schedule(key).decrypt(data[DES3.block_size:], data[:DES3.block_size])
+
+def key_material(key1_str, key2_str, key3_str):
+    # Length-prefix each key so ("ab", "c") and ("a", "bc") differ
+    parts = [k.encode('utf-8') for k in (key1_str, key2_str, key3_str)]
+    return b''.join(struct.pack('>H', len(part)) + part for part in parts)
+
+def run_kdf(material, salt, kdf_id, cost, key_size=24):
+    if kdf_id == KDF_IDS['pbkdf2']:
+        key = hashlib.pbkdf2_hmac('sha256', material, salt, cost, dklen=key_size)
+    elif kdf_id == KDF_IDS['scrypt']:
+        key = hashlib.scrypt(material, salt=salt, n=1 << cost, r=8, p=1,
+                             maxmem=SCRYPT_MAXMEM, dklen=key_size)
+    else:
+        raise ValueError("Unknown key derivation function")
+    return DES3.adjust_key_parity(key) if key_size == 24 else key
+
+def derive_key(material, salt, kdf_id, cost, key_size=24):
+    if cost > KDF_MAX_COSTS[kdf_id]:
+        raise ValueError("Key derivation cost too high")
+    digest = hashlib.sha256(material + salt + struct.pack('>BIB', kdf_id, cost, key_size)).digest()
+    key = derived_keys.get(digest)
+    if key is None:
+        key = run_kdf(material, salt, kdf_id, cost, key_size)
+        derived_keys.put(digest, key)
+    return key
+
+def encryption_key(key1_str, key2_str, key3_str, kdf=DEFAULT_KDF, mode=DEFAULT_MODE):
+    # Returns (header, key) for new ciphertext
+    if kdf not in KDF_IDS:
+        raise ValueError(f"Unknown KDF: {kdf}")
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode}")
+    mode_id = MODES[mode]
+    if kdf == 'none':
+        if mode_id:
+            raise ValueError("AEAD modes need a key derivation function")
+        return b'', build_3des_key(key1_str, key2_str, key3_str)
+    
+    kdf_id = KDF_IDS[kdf]
+    cost = KDF_COSTS[kdf_id]
+    material = key_material(key1_str, key2_str, key3_str)
+    # One salt per password set and mode, so no two ciphers ever share a key
+    session = b'salt' + hashlib.sha256(material + struct.pack('>BIB', kdf_id, cost, mode_id)).digest()
+    salt = derived_keys.get(session)
+    if salt is None:
+        salt = os.urandom(16)
+        derived_keys.put(session, salt)
+    if mode_id:
+        key = derive_key(material, salt, kdf_id, cost, AEAD_KEY_SIZE)
+        return AEAD_HEADER.pack(KDF_MAGIC, AEAD_VERSION, mode_id, kdf_id, cost, salt), key
+    key = derive_key(material, salt, kdf_id, cost)
+    return KDF_HEADER.pack(KDF_MAGIC, KDF_VERSION, kdf_id, cost, salt), key
+
+def decryption_key(data, key1_str, key2_str, key3_str):
+    # Returns (mode id, key, header length) for ciphertext starting with data
+    if data[:len(KDF_MAGIC)] != KDF_MAGIC or len(data) < KDF_HEADER.size:
+        return MODES['3des-cbc'], build_3des_key(key1_str, key2_str, key3_str), 0
+    version = data[len(KDF_MAGIC)]
+    if version == KDF_VERSION:
+        magic, version, kdf_id, cost, salt = KDF_HEADER.unpack_from(data)
+        mode_id, key_size, header_size = MODES['3des-cbc'], 24, KDF_HEADER.size
+    elif version == AEAD_VERSION and len(data) >= AEAD_HEADER.size:
+        magic, version, mode_id, kdf_id, cost, salt = AEAD_HEADER.unpack_from(data)
+        key_size, header_size = AEAD_KEY_SIZE, AEAD_HEADER.size
+    else:
+        raise ValueError("Unsupported ciphertext header")
+    if kdf_id not in KDF_MAX_COSTS or mode_id not in MODES.values():
+        raise ValueError("Unsupported ciphertext header")
+    material = key_material(key1_str, key2_str, key3_str)
+    return mode_id, derive_key(material, salt, kdf_id, cost, key_size), header_size
+
+def new_aead(mode_id, key, nonce):
+    if mode_id == MODES['aes-gcm']:
+        return AES.new(key, AES.MODE_GCM, nonce=nonce, mac_len=AEAD_TAG_SIZE)
+    return ChaCha20_Poly1305.new(key=key, nonce=nonce)
+
 # --- Triple DES (3DES) Functions ---
-def encrypt_3des(plaintext, key1_str, key2_str, key3_str):
+def build_3des_key(key1_str, key2_str, key3_str):
     # Keys must be exactly 8 bytes for DES
     key1 = pad(key1_str.encode('utf-8'), 8)[:8]
     key2 = pad(key2_str.encode('utf-8'), 8)[:8]
     key3 = pad(key3_str.encode('utf-8'), 8)[:8]
     
     # Concatenate the three 8-byte keys to form a single 24-byte key for 3DES
-    key = key1 + key2 + key3
-    
-    cipher = DES3.new(key, DES3.MODE_CBC)
-    ciphertext = cipher.encrypt(pad(plaintext.encode('utf-8'), DES3.block_size))
-    return b64encode(cipher.iv + ciphertext).decode('utf-8')
+    return key1 + key2 + key3
+
+def encrypt_bytes(data, header, key, mode_id=MODES['3des-cbc']):
+    # header + IV/nonce + ciphertext (+ tag for the AEAD modes)
+    if mode_id == MODES['3des-cbc']:
+        return header + des3_encrypt(key, pad(data, DES3.block_size))
+    nonce = os.urandom(AEAD_NONCE_SIZE)
+    cipher = new_aead(mode_id, key, nonce)
+    cipher.update(header)
+    ciphertext, tag = cipher.encrypt_and_digest(data)
+    return header + nonce + ciphertext + tag
+
+def decrypt_bytes(data, mode_id, key, header_size):
+    # Inverse of encrypt_bytes; raises ValueError on a wrong key or tampering
+    if mode_id == MODES['3des-cbc']:
+        return decrypt_cbc(data[header_size:], key)
+    body = data[header_size:]
+    if len(body) < AEAD_NONCE_SIZE + AEAD_TAG_SIZE:
+        raise ValueError("Ciphertext too short")
+    cipher = new_aead(mode_id, key, body[:AEAD_NONCE_SIZE])
+    cipher.update(data[:header_size])
+    return cipher.decrypt_and_verify(body[AEAD_NONCE_SIZE:-AEAD_TAG_SIZE], body[-AEAD_TAG_SIZE:])
+
+def encrypt_3des(plaintext, key1_str, key2_str, key3_str, kdf=DEFAULT_KDF, mode=DEFAULT_MODE):
+    header, key = encryption_key(key1_str, key2_str, key3_str, kdf, mode)
+    return b64encode(encrypt_bytes(plaintext.encode('utf-8'), header, key, MODES[mode])).decode('utf-8')
+
+def decrypt_cbc(data, key):
+    return unpad(des3_decrypt(key, data), DES3.block_size)
 
 def decrypt_3des(ciphertext, key1_str, key2_str, key3_str):
-    key1 = pad(key1_str.encode('utf-8'), 8)[:8]
-    key2 = pad(key2_str.encode('utf-8'), 8)[:8]
-    key3 = pad(key3_str.encode('utf-8'), 8)[:8]
-    
-    key = key1 + key2 + key3
-    
+    # Detects the format (old, KDF + 3DES-CBC or KDF + AEAD) from the header
     data = b64decode(ciphertext)
-    iv = data[:DES3.block_size]
-    encrypted_text = data[DES3.block_size:]
-    cipher = DES3.new(key, DES3.MODE_CBC, iv)
-    decrypted_text = unpad(cipher.decrypt(encrypted_text), DES3.block_size)
+    try:
+        mode_id, key, header_size = decryption_key(data, key1_str, key2_str, key3_str)
+        decrypted_text = decrypt_bytes(data, mode_id, key, header_size)
+    except ValueError as error:
+        if not data.startswith(KDF_MAGIC):
+            raise
+        # Maybe an old-format ciphertext whose IV happens to start with the magic
+        try:
+            decrypted_text = decrypt_cbc(data, build_3des_key(key1_str, key2_str, key3_str))
+        except ValueError:
+            raise error
     return decrypted_text.decode('utf-8')
 
+# --- Streaming 3DES (files and large bodies) ---
+# Output is binary IV + ciphertext, i.e. the base64-decoded form of /process.
+# One CBC cipher object is fed chunk after chunk, so the chaining state rolls
+# over between chunks and memory use stays at a few chunks whatever the size.
+def read_chunks(stream, chunk_size=STREAM_CHUNK_SIZE, close=False):
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        if close:
+            stream.close()
+
+def encrypt_3des_stream(chunks, key, header=b''):
+    cipher = des3_cbc(key)
+    yield header + cipher.iv
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        # Encrypt every whole block; carry the remainder into the next chunk
+        cut = len(pending) - len(pending) % DES3.block_size
+        if cut:
+            yield cipher.encrypt(pending[:cut])
+            pending = pending[cut:]
+    yield cipher.encrypt(pad(pending, DES3.block_size))
+
+def decrypt_3des_stream(chunks, key):
+    pending = b''
+    cipher = None
+    for chunk in chunks:
+        pending += chunk
+        if cipher is None:
+            if len(pending) < DES3.block_size:
+                continue
+            cipher = des3_cbc(key, pending[:DES3.block_size])
+            pending = pending[DES3.block_size:]
+        # Hold back the last block: it carries the padding
+        cut = len(pending) - len(pending) % DES3.block_size
+        if cut == len(pending):
+            cut -= DES3.block_size
+        if cut > 0:
+            yield cipher.decrypt(pending[:cut])
+            pending = pending[cut:]
+    if cipher is None or len(pending) != DES3.block_size:
+        raise ValueError("Ciphertext is truncated or not a multiple of the block size")
+    yield unpad(cipher.decrypt(pending), DES3.block_size)
+
+def skip_bytes(chunks, size):
+    for chunk in chunks:
+        if size:
+            chunk, size = chunk[size:], max(0, size - len(chunk))
+        if chunk:
+            yield chunk
+
+def peek_chunks(chunks, size):
+    # Read at least size bytes ahead (for the KDF header); returns (head, all chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+    def rest():
+        yield head
+        yield from chunks
+    return head, rest()
+
 # --- Flask Routes ---
 @app.route('/')
 def index():
@@ -51,6 +392,8 @@ def process():
     key2 = data['key2']
     key3 = data['key3']
     action = data['action']
+    kdf = data.get('kdf', DEFAULT_KDF)
+    mode = data.get('mode', DEFAULT_MODE)
 
     try:
         # Check if keys are provided
@@ -58,7 +401,7 @@ def process():
             return jsonify({'error': "Please provide all three keys."}), 400
 
         if action == 'encrypt':
-            result = encrypt_3des(text, key1, key2, key3)
+            result = encrypt_3des(text, key1, key2, key3, kdf, mode)
         elif action == 'decrypt':
             result = decrypt_3des(text, key1, key2, key3)
     except Exception as e:
@@ -66,5 +409,128 @@ def process():
 
     return jsonify({'result': result})
 
+def derivation_id(opts):
+    # What a KDF run for this item depends on, or None if it needs none
+    keys = (opts['key1'], opts['key2'], opts['key3'])
+    if opts['action'] == 'encrypt':
+        kdf = opts.get('kdf', DEFAULT_KDF)
+        return None if kdf == 'none' else (keys, kdf, opts.get('mode', DEFAULT_MODE))
+    header = b64decode(opts['text'])[:AEAD_HEADER.size]
+    # Decryption derives from the salt in the header
+    return (keys, header) if header.startswith(KDF_MAGIC) else None
+
+def process_items(items, defaults):
+    # Items share one key setup per (keys, kdf, mode): the key is derived
+    # (or fetched from the cache) once per group, not once per item
+    setups = {}
+    derivations = set()
+    results = []
+    for item in items:
+        try:
+            if isinstance(item, str):
+                item = {'text': item}
+            if not isinstance(item, dict) or not isinstance(item.get('text'), str):
+                raise ValueError("Each item must be a string or an object with a text field")
+            opts = {**defaults, **item}
+            keys = (opts['key1'], opts['key2'], opts['key3'])
+            if not all(keys):
+                raise ValueError("Please provide all three keys")
+            if opts['action'] in ('encrypt', 'decrypt'):
+                derivation = derivation_id(opts)
+                if derivation is not None and derivation not in derivations:
+                    if len(derivations) >= MAX_BATCH_KEY_SETS:
+                        raise ValueError(f"At most {MAX_BATCH_KEY_SETS} distinct key sets per batch")
+                    derivations.add(derivation)
+            if opts['action'] == 'encrypt':
+                group = (keys, opts.get('kdf', DEFAULT_KDF), opts.get('mode', DEFAULT_MODE))
+                if group not in setups:
+                    setups[group] = encryption_key(*group[0], kdf=group[1], mode=group[2])
+                header, key = setups[group]
+                data = encrypt_bytes(opts['text'].encode('utf-8'), header, key, MODES[group[2]])
+                results.append({'result': b64encode(data).decode('utf-8')})
+            elif opts['action'] == 'decrypt':
+                results.append({'result': decrypt_3des(opts['text'], *keys)})
+            else:
+                raise ValueError("Action must be encrypt or decrypt")
+        except Exception as e:
+            results.append({'error': f"Error: {str(e)}"})
+    return results
+
+@app.route('/process_batch', methods=['POST'])
+def process_batch():
+    """Encrypt or decrypt many texts in one request.
+    
+    Body: {"items": [...], "action", "key1", "key2", "key3", "kdf", "mode"}.
+    Items are strings or objects that override any of the shared fields.
+    Returns {"results": [...]} in item order; a failed item gets an
+    "error" instead of a "result" and does not fail the batch.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list):
+        return jsonify({'error': "Please provide a list of items."}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({'error': f"At most {MAX_BATCH_ITEMS} items per batch."}), 400
+    defaults = {k: data.get(k) for k in ('action', 'key1', 'key2', 'key3')}
+    defaults['kdf'] = data.get('kdf', DEFAULT_KDF)
+    defaults['mode'] = data.get('mode', DEFAULT_MODE)
+    return jsonify({'results': process_items(items, defaults)})
+
+@app.route('/kdf_cache/stats')
+def kdf_cache_stats():
+    return jsonify(derived_keys.stats())
+
+@app.route('/key_cache/stats')
+def key_cache_stats():
+    return jsonify(key_schedules.stats())
+
+@app.route('/process_stream', methods=['POST'])
+def process_stream():
+    """Encrypt or decrypt an uploaded file (multipart field "file") or the raw request body.
+    
+    Keys come from the X-Key1/X-Key2/X-Key3 headers and the action from
+    ?action=encrypt|decrypt; the binary result is streamed back. A wrong key
+    or corrupt input on decrypt only shows up at the final padding check,
+    which aborts the response.
+    """
+    keys = [request.headers.get(f'X-Key{i}') for i in (1, 2, 3)]
+    action = request.args.get('action')
+    if not all(keys):
+        return jsonify({'error': "Please provide all three keys."}), 400
+    if action not in ('encrypt', 'decrypt'):
+        return jsonify({'error': "Action must be encrypt or decrypt."}), 400
+    
+    upload = request.files.get('file')
+    if upload:
+        # Detach the (spooled) upload: the request closes its files as soon
+        # as this view returns, before the response has been streamed
+        chunks = read_chunks(upload.stream, close=True)
+        upload.stream = io.BytesIO()
+        filename = secure_filename(upload.filename or '') or 'data'
+    else:
+        chunks = read_chunks(request.stream)
+        filename = 'data'
+    try:
+        if action == 'encrypt':
+            header, key = encryption_key(*keys, kdf=request.headers.get('X-KDF', DEFAULT_KDF))
+        else:
+            head, chunks = peek_chunks(chunks, AEAD_HEADER.size)
+            mode_id, key, header_size = decryption_key(head, *keys)
+            if mode_id != MODES['3des-cbc']:
+                raise ValueError("AEAD ciphertext must be decrypted with /process")
+        des3_schedule(key)  # rejects degenerate keys before anything is streamed
+    except Exception as e:
+        return jsonify({'error': f"Error: {str(e)}. Please check your keys or input."}), 400
+    
+    if action == 'encrypt':
+        output = encrypt_3des_stream(chunks, key, header)
+        filename += '.3des'
+    else:
+        output = decrypt_3des_stream(skip_bytes(chunks, header_size), key)
+        filename = filename[:-5] if filename.endswith('.3des') else filename + '.dec'
+    
+    return Response(stream_with_context(output), mimetype='application/octet-stream',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,70 @@
+"""Key derivation cost and the derived-key cache.
+
+Times one cold derivation per KDF, then replays a workload of sessions
+(one password set each) that encrypt and decrypt several messages, with the
+cache enabled and disabled, reporting hit rate and per-request latency.
+
+Usage: python benchmarks/bench_kdf.py [sessions] [requests per session]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as tdes
+
+
+def reset_cache(max_entries):
+    cache = tdes.derived_keys
+    cache.entries.clear()
+    cache.hits = cache.misses = 0
+    cache.max_entries = max_entries
+
+
+def run_workload(kdf, sessions, per_session):
+    latencies = []
+    for s in range(sessions):
+        keys = (f"alpha-{s}", f"bravo-{s}", f"charlie-{s}")
+        tokens = []
+        for r in range(per_session):
+            start = time.perf_counter()
+            if r % 2 == 0:
+                tokens.append(tdes.encrypt_3des(f"message {r} of session {s}", *keys, kdf))
+            else:
+                tdes.decrypt_3des(tokens[-1], *keys)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    per_session = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    material = tdes.key_material("alpha", "bravo", "charlie")
+    salt = os.urandom(16)
+
+    print(f"{'kdf':<8}{'cost':>8}{'derive ms':>12}")
+    for name in ("pbkdf2", "scrypt"):
+        kdf_id = tdes.KDF_IDS[name]
+        start = time.perf_counter()
+        tdes.run_kdf(material, salt, kdf_id, tdes.KDF_COSTS[kdf_id])
+        print(f"{name:<8}{tdes.KDF_COSTS[kdf_id]:>8}{(time.perf_counter() - start) * 1000:>12.1f}")
+
+    print(f"\n{sessions} sessions x {per_session} requests (alternating encrypt/decrypt)")
+    print(f"{'kdf':<8}{'cache':<7}{'hit rate':>9}{'mean ms':>10}{'p95 ms':>9}{'req/s':>9}")
+    for name in ("none", "pbkdf2", "scrypt"):
+        for max_entries in (1024, 0):
+            reset_cache(max_entries)
+            start = time.perf_counter()
+            latencies = run_workload(name, sessions, per_session)
+            elapsed = time.perf_counter() - start
+            stats = tdes.derived_keys.stats()
+            p95 = statistics.quantiles(latencies, n=20)[18]
+            print(f"{name:<8}{'on' if max_entries else 'off':<7}{stats['hit_rate']:>9.2%}"
+                  f"{statistics.mean(latencies):>10.2f}{p95:>9.2f}{len(latencies) / elapsed:>9.1f}")
+    reset_cache(1024)
+
+
+if __name__ == "__main__":
+    main()
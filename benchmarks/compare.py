@@ -0,0 +1,73 @@
+"""Compare two benchmark result files and flag slowdowns.
+
+Cases are matched by name and compared on their median time per call
+(mean for the per-stage entries, which have no samples). A case counts as
+a regression when it is slower than the baseline by more than the
+threshold and even its fastest sample is slower than the baseline median,
+which keeps one noisy repeat from failing the check. Exits with status 1
+if any case regressed.
+
+Usage: python benchmarks/compare.py baseline.json current.json [--threshold 0.10]
+"""
+
+import argparse
+import json
+import sys
+
+from harness import format_seconds
+
+
+def typical(result):
+    return result.get("median", result.get("mean"))
+
+
+def compare(baseline, current, threshold):
+    """Rows of (name, old s/call, new s/call, ratio, status) for cases in both runs"""
+    old = {r["name"]: r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        previous = old.get(result["name"])
+        if previous is None:
+            rows.append((result["name"], None, typical(result), None, "new"))
+            continue
+        ratio = typical(result) / typical(previous)
+        if ratio > 1 + threshold and result.get("min", typical(result)) > typical(previous):
+            status = "REGRESSION"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((result["name"], typical(previous), typical(result), ratio, status))
+    return rows
+
+
+def print_report(rows, threshold):
+    width = max([len(row[0]) for row in rows] + [4])
+    print(f"{'case':<{width}}{'baseline':>12}{'current':>12}{'change':>9}  status")
+    for name, old, new, ratio, status in rows:
+        old_text = format_seconds(old) if old is not None else "-"
+        change = f"{(ratio - 1) * 100:+.1f}%" if ratio is not None else "-"
+        print(f"{name:<{width}}{old_text:>12}{format_seconds(new):>12}{change:>9}  {status}")
+    regressions = [row for row in rows if row[4] == "REGRESSION"]
+    print(f"\n{len(regressions)} regression(s) over {threshold:.0%} in {len(rows)} cases")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown as a fraction (default 0.10)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = print_report(compare(baseline, current, args.threshold), args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Timing harness shared by the benchmark suites.
+
+A case is a callable timed in repeats of `number` calls each, after a
+warmup. `number` is calibrated so one repeat lasts at least min_time,
+unless the case fixes it (cases that consume prepared inputs, such as
+validating fresh tickets, need to know how many calls are coming).
+Garbage collection is disabled while a repeat runs, as in timeit.
+"""
+
+import gc
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Callable, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class Settings:
+    warmup: int = 3        # untimed repeats before measuring
+    repeats: int = 15      # timed repeats (one sample each)
+    min_time: float = 0.05  # seconds per repeat when number is calibrated
+
+
+QUICK = Settings(warmup=1, repeats=5, min_time=0.01)
+
+
+@dataclass
+class Case:
+    name: str
+    func: Callable[[], object]
+    number: Optional[int] = None   # calls per repeat; None = calibrate
+    nbytes: Optional[int] = None   # bytes processed per call, for MB/s
+    params: dict = field(default_factory=dict)
+
+
+@dataclass
+class Skip:
+    name: str
+    reason: str
+
+
+def calibrate(func, min_time):
+    """Smallest power-of-ten call count whose run takes at least min_time"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time or number >= 10 ** 6:
+            return number
+        number *= 10
+
+
+def timed_repeat(func, number):
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return (time.perf_counter() - start) / number
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list"""
+    position = (len(sorted_values) - 1) * fraction
+    low, high = math.floor(position), math.ceil(position)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": statistics.fmean(ordered),
+        "median": median,
+        "p95": percentile(ordered, 0.95),
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "ops_per_sec": 1 / median if median > 0 else None,
+    }
+
+
+def measure(case, settings):
+    """Time one case, returning its JSON-ready result"""
+    number = case.number or calibrate(case.func, settings.min_time)
+    for _ in range(settings.warmup):
+        timed_repeat(case.func, number)
+    samples = [timed_repeat(case.func, number) for _ in range(settings.repeats)]
+    result = {"name": case.name, "params": case.params, "number": number,
+              "repeats": settings.repeats, "unit": "s/call", **summarize(samples)}
+    if case.nbytes:
+        result["mb_per_sec"] = case.nbytes / result["median"] / 1e6
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                              capture_output=True, timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def package_versions(names):
+    versions = {}
+    for name in names:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def environment():
+    """Where and on what the numbers were taken, stored with every run"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": package_versions(["cryptography", "pycryptodome", "qrcode", "pillow",
+                                      "opencv-python-headless", "pyzbar", "flask"]),
+    }
+
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
@@ -0,0 +1,89 @@
+"""Run the crypto benchmark suites and write the results as JSON.
+
+Suites: "ticketing" (secure-qr-ticketing: signatures, AES-GCM, QR images,
+create_ticket/validate_ticket end to end and per stage) and "3des" (the
+3DES web app's encrypt/decrypt across input sizes). Inputs come from a
+seeded RNG so runs are comparable; each result file also records the
+machine, Python, package versions and git revision.
+
+Usage:
+  python benchmarks/run.py [--suite ticketing --suite 3des] [--quick]
+                           [--output results.json] [--baseline old.json] [--threshold 0.10]
+
+With --baseline the run is compared against an earlier result file and
+the exit status is 1 if any case got slower by more than the threshold.
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+import compare
+import harness
+import suite_3des
+import suite_ticketing
+
+SUITES = {"ticketing": suite_ticketing, "3des": suite_3des}
+
+
+def run_suites(names, settings, seed):
+    results, skipped = [], []
+    for name in names:
+        print(f"== {name}", file=sys.stderr)
+        cwd = os.getcwd()
+        try:
+            for item in SUITES[name].run(lambda case: harness.measure(case, settings), settings, seed):
+                if isinstance(item, harness.Skip):
+                    skipped.append({"name": item.name, "reason": item.reason})
+                    print(f"  {item.name:<44} skipped: {item.reason}", file=sys.stderr)
+                    continue
+                results.append(item)
+                speed = f"  {item['mb_per_sec']:9.1f} MB/s" if "mb_per_sec" in item else ""
+                spread = f"  p95 {harness.format_seconds(item['p95'])}" if "p95" in item else ""
+                print(f"  {item['name']:<44}{harness.format_seconds(compare.typical(item)):>12}"
+                      f"{spread}{speed}", file=sys.stderr)
+        finally:
+            os.chdir(cwd)  # the ticketing suite works in a scratch directory
+    return results, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES),
+                        help="suite to run (repeatable; default all)")
+    parser.add_argument("--quick", action="store_true", help="fewer, shorter repeats")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="result file (default bench-<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown as a fraction (default 0.10)")
+    args = parser.parse_args()
+
+    settings = harness.QUICK if args.quick else harness.Settings()
+    output = os.path.abspath(args.output or f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    names = args.suite or list(SUITES)
+
+    results, skipped = run_suites(names, settings, args.seed)
+    report = {
+        "environment": harness.environment(),
+        "settings": {**vars(settings), "seed": args.seed, "suites": names},
+        "results": results,
+        "skipped": skipped,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {output}", file=sys.stderr)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare.print_report(compare.compare(baseline, report, args.threshold),
+                                           args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""3DES web app cases: encrypt_3des/decrypt_3des across input sizes.
+
+kdf "none" times the cipher alone; "pbkdf2" adds the header and the
+derived-key cache lookup (the one real derivation happens in warmup).
+"""
+
+import os
+import random
+import sys
+
+from harness import ROOT, Case
+
+PROJECT_DIR = os.path.join(ROOT, "3des")
+SIZES = [64, 1024, 16 * 1024, 256 * 1024]
+KDFS = ["none", "pbkdf2"]
+KEYS = ("alpha-key", "bravo-key", "charlie-key")
+
+
+def run(measure, settings, seed):
+    """Yield result dicts"""
+    sys.path.insert(0, PROJECT_DIR)
+    import app as tdes
+
+    rng = random.Random(seed)
+    for kdf in KDFS:
+        for size in SIZES:
+            text = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz0123456789 ", k=size))
+            token = tdes.encrypt_3des(text, *KEYS, kdf)
+            assert tdes.decrypt_3des(token, *KEYS) == text
+            params = {"kdf": kdf, "bytes": size}
+            yield measure(Case(f"3des.encrypt_3des[{kdf},{size}]",
+                               lambda t=text, k=kdf: tdes.encrypt_3des(t, *KEYS, k),
+                               nbytes=size, params=params))
+            yield measure(Case(f"3des.decrypt_3des[{kdf},{size}]",
+                               lambda c=token: tdes.decrypt_3des(c, *KEYS),
+                               nbytes=size, params=params))
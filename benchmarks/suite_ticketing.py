@@ -0,0 +1,146 @@
+"""Ticketing cases: signing, AEAD, QR images and the create/validate pipeline.
+
+Main.py is imported from a scratch directory (it writes tickets.db and key
+files next to itself), using the loader from the project's own benchmarks.
+"""
+
+import io
+import os
+import random
+import sys
+
+from harness import ROOT, Case, Skip
+
+PROJECT_DIR = os.path.join(ROOT, "secure-qr-ticketing-system-1OX22CS039-1OX22CS041-1OX22CS058",
+                           "secure-qr-ticketing")
+AEAD_SIZES = [256, 4 * 1024, 64 * 1024]
+PIPELINE_CALLS = 20  # calls per repeat for the stateful create/validate cases
+
+
+def load_project():
+    sys.path.insert(0, os.path.join(PROJECT_DIR, "benchmarks"))
+    from common import load_main
+    Main, _ = load_main()
+    return Main
+
+
+def signature_cases(Main, rng):
+    data = rng.randbytes(300)  # about one serialized ticket
+    for scheme in Main.SIGNERS:
+        system = Main.SecureTicketingSystem(signature_scheme=scheme, qr_mode="lazy",
+                                            metrics_enabled=False)
+        signature = system.sign_data(data)
+        key_id = system.signer.key_id
+        params = {"scheme": scheme, "bytes": len(data)}
+        yield Case(f"ticketing.sign_data[{scheme}]", lambda s=system: s.sign_data(data), params=params)
+        yield Case(f"ticketing.verify_signature[{scheme}]",
+                   lambda s=system, sig=signature, k=key_id: s.verify_signature(data, sig, k),
+                   params=params)
+
+
+def aead_cases(system, rng):
+    key, iv = system.generate_aes_key()
+    aad = b"\x04\x00" + bytes(8)
+    for size in AEAD_SIZES:
+        data = rng.randbytes(size)
+        sealed = system.encrypt_data(data, key, iv, aad)
+        params = {"bytes": size}
+        yield Case(f"ticketing.encrypt_data[{size}]", lambda d=data: system.encrypt_data(d, key, iv, aad),
+                   nbytes=size, params=params)
+        yield Case(f"ticketing.decrypt_data[{size}]", lambda c=sealed: system.decrypt_data(c, key, iv, aad),
+                   nbytes=size, params=params)
+
+
+def qr_cases(system):
+    qr_data = system.seal_ticket(system.build_ticket_data("Bench Event", "Holder", "S-1"))
+    image = system.make_qr_image(qr_data).get_image()
+
+    def png_encode():
+        buf = io.BytesIO()
+        image.save(buf, format="PNG")
+        return buf
+
+    params = {"payload_chars": len(qr_data)}
+    yield Case("ticketing.qr_make_image", lambda: system.make_qr_image(qr_data), params=params)
+    yield Case("ticketing.qr_png_encode", png_encode, params=params)
+
+    try:
+        import numpy as np
+        sys.path.insert(0, PROJECT_DIR)
+        from qr_scanner import decode_qr
+    except ImportError as e:
+        yield Skip("ticketing.qr_decode", f"decoder unavailable: {e}")
+        return
+    gray = np.asarray(image.convert("L"))
+    assert decode_qr(gray) == [qr_data]
+    yield Case("ticketing.qr_decode", lambda: decode_qr(gray), params=params)
+
+
+def payload_cases(Main):
+    """parse_payload for the legacy base64+JSON envelope vs the base45 binary payload"""
+    for fmt in ("json", "binary"):
+        system = Main.SecureTicketingSystem(payload_format=fmt, signature_scheme="ed25519",
+                                            qr_mode="lazy", metrics_enabled=False)
+        qr_data = system.seal_ticket(system.build_ticket_data("Bench Event", "Holder", "S-1"))
+        yield Case(f"ticketing.parse_payload[{fmt}]", lambda s=system, q=qr_data: s.parse_payload(q),
+                   params={"format": fmt, "payload_chars": len(qr_data)})
+        if fmt == "binary":
+            yield Case("ticketing.b45decode", lambda q=qr_data: Main.b45decode(q),
+                       params={"payload_chars": len(qr_data)})
+
+
+def pipeline_cases(system, settings):
+    """create_ticket and validate_ticket end to end (QR images rendered lazily)"""
+    counter = iter(range(10 ** 9))
+    yield Case("ticketing.create_ticket",
+               lambda: system.create_ticket("Bench Event", "Holder", f"S-{next(counter)}"),
+               number=PIPELINE_CALLS)
+
+    # Every validate_ticket call redeems a fresh ticket, so issue them up front
+    needed = (settings.warmup + settings.repeats) * PIPELINE_CALLS
+    fresh = iter([system.create_ticket("Validate Event", "Holder", f"V-{i}")["qr_data"]
+                  for i in range(needed)])
+
+    def validate():
+        result = system.validate_ticket(next(fresh))
+        assert result["valid"], result
+
+    yield Case("ticketing.validate_ticket", validate, number=PIPELINE_CALLS)
+
+
+def stage_results(system, before):
+    """Mean time per pipeline stage recorded by the system's metrics"""
+    results = []
+    for stage, (count, total) in sorted(system.metrics.stage_totals().items()):
+        count -= before.get(stage, (0, 0.0))[0]
+        total -= before.get(stage, (0, 0.0))[1]
+        if count:
+            results.append({"name": f"ticketing.stage.{stage}", "params": {}, "number": count,
+                            "unit": "s/call", "mean": total / count})
+    return results
+
+
+def run(measure, settings, seed):
+    """Yield result dicts, and Skip for cases that cannot run here"""
+    rng = random.Random(seed)
+    Main = load_project()
+    system = Main.SecureTicketingSystem(qr_mode="lazy", metrics_enabled=False)
+
+    for case in signature_cases(Main, rng):
+        yield measure(case)
+    for case in aead_cases(system, rng):
+        yield measure(case)
+    for case in qr_cases(system):
+        yield case if isinstance(case, Skip) else measure(case)
+    for case in payload_cases(Main):
+        yield measure(case)
+
+    # Per-stage numbers come from the pipeline's own metrics, taken while
+    # the end-to-end cases run; the verify cache is off so every
+    # validation decrypts and verifies
+    instrumented = Main.SecureTicketingSystem(qr_mode="lazy", metrics_enabled=True,
+                                              verify_cache_options={"max_entries": 0})
+    before = instrumented.metrics.stage_totals()
+    for case in pipeline_cases(instrumented, settings):
+        yield measure(case)
+    yield from stage_results(instrumented, before)
@@ -6,95 +6,1010 @@ import base64
 import time
 import uuid
 import hashlib
+import hmac
 import re
+import struct
+import bisect
+import zlib
+import sys
 from datetime import datetime, timedelta
 from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.asymmetric import rsa, padding, ec, ed25519
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.backends import default_backend
+import io
 import qrcode
 from PIL import Image
 import os
 import sqlite3
-from flask import Flask, request, jsonify, render_template_string
+import threading
+import weakref
+from collections import deque, OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from flask import (Blueprint, Flask, Response, current_app, request, jsonify,
+                   render_template_string, stream_with_context)
+from redemption_index import build_index, entry_signature, load_gate_keys, verify_gate_request
+from redemption_log import RedemptionLog
 
-class SecureTicketingSystem:
-    def __init__(self):
-        self.backend = default_backend()
-        self.db_path = "tickets.db"
-        self.init_database()
+# Compact binary QR payload
+# v1 layout: version | flags | iv(12) | tag(16) | key(32) | sig_len(2) | signature | ciphertext
+# v2 adds a 4-byte signing key id after the flags.
+# v3 moves the GCM tag to the end of the ciphertext and authenticates
+# version | flags | key id as associated data.
+# v4 replaces the embedded AES key with the 4-byte id of a server-side
+# data-encryption key (see Keyring); version | flags | both key ids are
+# the associated data.
+# The whole blob is base45 encoded so the QR code can use alphanumeric mode.
+PAYLOAD_VERSION = 4
+PAYLOAD_FLAG_COMPRESSED = 0x01
+PAYLOAD_HEADERS = {
+    1: struct.Struct(">BB12s16s32sH"),
+    2: struct.Struct(">BB4s12s16s32sH"),
+    3: struct.Struct(">BB4s12s32sH"),
+    4: struct.Struct(">BB4s4s12sH"),
+}
+PAYLOAD_AAD_SIZES = {3: 6, 4: 10}
+GCM_TAG_SIZE = 16
+
+BASE45_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+# Byte -> base45 digit value, 0xFF for bytes outside the alphabet
+BASE45_TABLE = bytes(BASE45_ALPHABET.index(chr(i)) if chr(i) in BASE45_ALPHABET else 0xFF
+                     for i in range(256))
+BASE45_LOW_HIGH_DIGITS = bytes(range(32))  # high digits that can never overflow a chunk
+
+def b45encode(data):
+    """Base45 encode bytes (RFC 9285)"""
+    out = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        n, c = divmod(n, 45)
+        e, d = divmod(n, 45)
+        out.append(BASE45_ALPHABET[c] + BASE45_ALPHABET[d] + BASE45_ALPHABET[e])
+    if len(data) % 2:
+        d, c = divmod(data[-1], 45)
+        out.append(BASE45_ALPHABET[c] + BASE45_ALPHABET[d])
+    return "".join(out)
+
+def b45decode(text):
+    """Base45 decode a string (RFC 9285).
+    
+    Runs on every scan, so no Python-level loop per chunk: the digits are
+    mapped with bytes.translate, the first, second and third digit of every
+    chunk are spread into 16-bit slots of three big integers, and
+    low + 45 * mid + 2025 * high gives the decoded bytes in one go.
+    """
+    try:
+        values = text.encode("ascii").translate(BASE45_TABLE)
+    except UnicodeEncodeError:
+        raise ValueError("Invalid base45 character")
+    if 0xFF in values:
+        raise ValueError("Invalid base45 character")
+    words, rest = divmod(len(values), 3)
+    end = words * 3
+    high = values[2:end:3]
+    # A chunk fits 16 bits only if its high digit is below 32, or 32 with
+    # low + 45 * mid <= 735; checked first so slots never carry
+    over = high.translate(None, BASE45_LOW_HIGH_DIGITS)
+    if over:
+        if over.count(32) != len(over):
+            raise ValueError("Invalid base45 data")
+        i = high.find(32)
+        while i >= 0:
+            if values[3 * i] + 45 * values[3 * i + 1] > 735:
+                raise ValueError("Invalid base45 data")
+            i = high.find(32, i + 1)
+    size = 2 * words
+    low = bytearray(size)
+    low[1::2] = values[0:end:3]
+    mid = bytearray(size)
+    mid[1::2] = values[1:end:3]
+    top = bytearray(size)
+    top[1::2] = high
+    out = (int.from_bytes(low, "big") + 45 * int.from_bytes(mid, "big")
+           + 2025 * int.from_bytes(top, "big")).to_bytes(size, "big")
+    if rest == 2:
+        last = values[end] + values[end + 1] * 45
+        if last > 0xFF:
+            raise ValueError("Invalid base45 data")
+        return out + bytes((last,))
+    if rest:
+        raise ValueError("Invalid base45 length")
+    return out
+
+# Signature schemes
+class TicketSigner:
+    """Base class for the ticket signature schemes.
+    
+    Each signer is identified by a 4-byte key id (truncated SHA-256 of the
+    public key), which is embedded in every payload so tickets signed with
+    an older key or scheme can still be verified.
+    """
+    scheme = None
+    key_files = None  # (private, public) PEM file names
+    
+    def __init__(self, private_key=None, public_key=None):
+        self.private_key = private_key
+        self.public_key = public_key or private_key.public_key()
+        spki = self.public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.key_id = hashlib.sha256(spki).digest()[:4]
+    
+    @classmethod
+    def generate(cls):
+        raise NotImplementedError
+    
+    def sign(self, data):
+        raise NotImplementedError
+    
+    def verify(self, signature, data):
+        """Raise InvalidSignature if the signature does not match"""
+        raise NotImplementedError
+    
+    def private_pem(self):
+        return self.private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+    
+    def public_pem(self):
+        return self.public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+class RSAPSSSigner(TicketSigner):
+    """RSA-2048 PSS with SHA-256 (the original scheme)"""
+    scheme = "rsa-pss"
+    key_files = ("private_key.pem", "public_key.pem")
+    
+    @classmethod
+    def generate(cls):
+        return cls(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    
+    def sign(self, data):
+        return self.private_key.sign(
+            data,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
+    
+    def verify(self, signature, data):
+        self.public_key.verify(
+            signature,
+            data,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
+
+class Ed25519Signer(TicketSigner):
+    """Ed25519 - fastest signing and a 64-byte signature"""
+    scheme = "ed25519"
+    key_files = ("ed25519_private_key.pem", "ed25519_public_key.pem")
+    
+    @classmethod
+    def generate(cls):
+        return cls(ed25519.Ed25519PrivateKey.generate())
+    
+    def sign(self, data):
+        return self.private_key.sign(data)
+    
+    def verify(self, signature, data):
+        self.public_key.verify(signature, data)
+
+class ECDSAP256Signer(TicketSigner):
+    """ECDSA over P-256 with SHA-256 (~72-byte DER signature)"""
+    scheme = "ecdsa-p256"
+    key_files = ("ecdsa_p256_private_key.pem", "ecdsa_p256_public_key.pem")
+    
+    @classmethod
+    def generate(cls):
+        return cls(ec.generate_private_key(ec.SECP256R1()))
+    
+    def sign(self, data):
+        return self.private_key.sign(data, ec.ECDSA(hashes.SHA256()))
+    
+    def verify(self, signature, data):
+        self.public_key.verify(signature, data, ec.ECDSA(hashes.SHA256()))
+
+SIGNERS = {cls.scheme: cls for cls in (RSAPSSSigner, Ed25519Signer, ECDSAP256Signer)}
+
+# Image formats served by /tickets/<id>/qr.<format>?token=<token from issuance>
+QR_IMAGE_FORMATS = {
+    "png": "image/png",
+    "gif": "image/gif",
+    "bmp": "image/bmp",
+    "webp": "image/webp"
+}
+
+class _ConnectionHolder:
+    """Thread-local owner of one connection; closing it is tied to its lifetime"""
+    
+    __slots__ = ("conn", "__weakref__")
+    
+    def __init__(self, conn):
+        self.conn = conn
+
+class TicketDatabase:
+    """Per-thread pooled SQLite connections for the ticket store.
+    
+    Each thread keeps one open connection, so a scan no longer pays for
+    connect + close. The connection is closed when its thread ends, so
+    thread-per-request servers do not pile up open files. The database
+    runs in WAL mode so readers never block the writer, and sqlite3's
+    statement cache keeps the prepared queries.
+    """
+    
+    def __init__(self, db_path, journal_mode="WAL", synchronous="NORMAL",
+                 cache_size=-16000, busy_timeout=5.0, cached_statements=256):
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size  # negative = size in KiB
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._connections = set()
+        self._pid = os.getpid()
+    
+    def connection(self):
+        """Return this thread's connection, opening it on first use"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout,
+                cached_statements=self.cached_statements,
+                check_same_thread=False
+            )
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+            holder = _ConnectionHolder(conn)
+            with self._lock:
+                self._connections.add(conn)
+            # The thread-local holder is dropped when the thread exits
+            weakref.finalize(holder, self._release, conn, self._pid)
+            self._local.holder = holder
+        return holder.conn
+    
+    def _release(self, conn, pid):
+        """Close the connection of a finished thread"""
+        if pid != os.getpid():
+            return  # inherited across fork: abandon, see _reset_after_fork
+        with self._lock:
+            self._connections.discard(conn)
+        conn.close()
+    
+    def open_connections(self):
+        return len(self._connections)
+    
+    def _reset_after_fork(self):
+        """Drop connections inherited from the parent of a forked worker.
         
-        # Generate or load RSA key pair
-        if not os.path.exists("private_key.pem"):
-            self.generate_keys()
-        else:
-            self.load_keys()
+        SQLite connections must not be used across fork(), so a pre-forking
+        server (gunicorn --preload) gets fresh connections in each worker.
+        The inherited handles are abandoned, not closed.
+        """
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._connections = set()
+        self._pid = os.getpid()
     
-    def init_database(self):
-        """Initialize SQLite database for ticket tracking"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
+    def close_all(self):
+        """Close every connection opened through this manager"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+SHARD_KEYS = ("event", "ticket")
+
+def shard_index(key, count):
+    """Stable shard number for a routing key (the same in every process)"""
+    return zlib.crc32(key.encode()) % count if count > 1 else 0
+
+def shard_paths(db_path, count):
+    """File per shard: tickets.db itself for one shard, else tickets.shard<i>.db"""
+    if count == 1:
+        return [db_path]
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.shard{i}{ext or '.db'}" for i in range(count)]
+
+class TicketShards:
+    """Routes tickets to one of several SQLite files.
+    
+    SQLite allows one writer per file, so with a single tickets.db a big
+    sale holds up redemptions for every other event. With shard_by="event"
+    each event lives entirely in one shard (chosen by a hash of its name),
+    so events in different shards never wait on each other. With
+    shard_by="ticket" tickets are spread by a hash of their id, which also
+    splits one huge event across all files. An event's row in the events
+    table always lives in the event's shard.
+    """
+    
+    def __init__(self, db_path, shards=1, shard_by="event", db_options=None):
+        if shard_by not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key: {shard_by}")
+        if shards < 1:
+            raise ValueError("Need at least one shard")
+        self.count = shards
+        self.shard_by = shard_by
+        self.paths = shard_paths(db_path, shards)
+        self.databases = [TicketDatabase(path, **(db_options or {})) for path in self.paths]
+    
+    def for_event(self, event_name):
+        """Shard holding the event's row (and, by event, all its tickets)"""
+        return self.databases[shard_index(event_name, self.count)]
+    
+    def event_databases(self, event_name):
+        """Shards that can hold tickets of the event"""
+        if self.shard_by == "event":
+            return [self.for_event(event_name)]
+        return self.databases
+    
+    def for_ticket(self, ticket_id, event_name=None):
+        """Shard for a ticket; without its event name this may probe every shard"""
+        if self.shard_by == "ticket":
+            return self.databases[shard_index(ticket_id, self.count)]
+        if event_name is not None:
+            return self.for_event(event_name)
+        return self.locate(ticket_id)
+    
+    def locate(self, ticket_id):
+        """Find the shard that has the ticket (live or archived)"""
+        if self.count == 1 or self.shard_by == "ticket":
+            return self.databases[shard_index(ticket_id, self.count)]
+        for db in self.databases:
+            found = db.connection().execute('''
+                SELECT 1 FROM tickets WHERE ticket_id = ?
+                UNION ALL SELECT 1 FROM tickets_archive WHERE ticket_id = ?
+            ''', (ticket_id, ticket_id)).fetchone()
+            if found:
+                return db
+        return self.databases[0]
+    
+    def layout(self, index):
+        return {"shard": str(index), "shard_count": str(self.count), "shard_by": self.shard_by}
+    
+    def close_all(self):
+        for db in self.databases:
+            db.close_all()
+
+class LRUCache:
+    """Thread-safe LRU/TTL cache bounded by entry count and estimated bytes.
+    
+    Entries are evicted least-recently-used first once either max_entries
+    or the max_bytes memory estimate is exceeded, and expire after ttl.
+    """
+    
+    # dict node + key + value tuple + timestamp
+    ENTRY_OVERHEAD = 232
+    
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # digest -> (expires_at, size, value)
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def entry_size(cls, value):
+        """Approximate memory held by one cached value"""
+        return cls.ENTRY_OVERHEAD + sys.getsizeof(value)
+    
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+    
+    def put(self, key, value):
+        size = self.entry_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.current_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self.current_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class VerifiedTicketCache(LRUCache):
+    """Cache of opened (decrypted + verified) tickets.
+    
+    Keyed by the SHA-256 of the raw QR string, so a repeat scan of the same
+    code (re-entry attempts, bad reads, replays) skips the crypto entirely.
+    """
+    
+    @classmethod
+    def entry_size(cls, value):
+        """Approximate memory held by one cached (ticket_data, reason) pair"""
+        ticket_data, reason = value
+        size = cls.ENTRY_OVERHEAD + (sys.getsizeof(reason) if reason else 0)
+        if ticket_data:
+            size += sys.getsizeof(ticket_data)
+            for k, v in ticket_data.items():
+                size += sys.getsizeof(k) + sys.getsizeof(v)
+        return size
+
+# Server-side data-encryption keys
+class Keyring:
+    """Data-encryption keys (DEKs) for ticket payloads, kept on the server.
+    
+    Every key is its own file, key_dir/<key id>.key, so a QR code only
+    carries the 4-byte id. In "rotating" mode there is one active key,
+    replaced once it is older than rotate_after seconds; in "event" mode
+    each event gets its own key. Old keys stay on disk so tickets issued
+    under them keep validating.
+    
+    Key files are created exclusively and never rewritten, which lets
+    several server workers share the directory: keys made by another
+    worker are picked up on a lookup miss, or when the directory changes
+    (checked at most every reload_interval seconds).
+    """
+    
+    KEY_ID_SIZE = 4
+    MODES = ("rotating", "event")
+    LINK_KEY_FILE = "qr_links.secret"
+    
+    def __init__(self, key_dir="ticket_keys", mode="rotating", rotate_after=30 * 24 * 3600,
+                 reload_interval=5.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown keyring mode: {mode}")
+        self.key_dir = key_dir
+        self.mode = mode
+        self.rotate_after = rotate_after
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._keys = {}    # key id -> (AESGCM, event_name or None, created_ts)
+        self._active = {}  # event_name (None when rotating) -> key id
+        self._dir_mtime = None
+        self._checked = 0.0
+        self._link_key = None
+        os.makedirs(key_dir, exist_ok=True)
+        self.reload()
+    
+    def link_key(self):
+        """Secret for per-ticket QR image tokens, shared by every worker.
+        
+        Created on first use and published with an atomic link, so when
+        several workers start at once they all end up with the same one.
+        """
+        if self._link_key is None:
+            path = os.path.join(self.key_dir, self.LINK_KEY_FILE)
+            if not os.path.exists(path):
+                tmp_file = f"{path}.{os.getpid()}.tmp"
+                fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(os.urandom(32))
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    os.link(tmp_file, path)
+                except FileExistsError:
+                    pass  # another worker won; use its key
+                finally:
+                    os.remove(tmp_file)
+            with open(path, "rb") as f:
+                self._link_key = f.read()
+        return self._link_key
+    
+    def options(self):
+        """Constructor arguments, for rebuilding the keyring in a worker process"""
+        return {"key_dir": self.key_dir, "mode": self.mode, "rotate_after": self.rotate_after,
+                "reload_interval": self.reload_interval}
+    
+    def reload(self):
+        """Load key files that are not in memory yet"""
+        with self._lock:
+            self._checked = time.monotonic()
+            self._dir_mtime = os.stat(self.key_dir).st_mtime_ns
+            for name in os.listdir(self.key_dir):
+                if not name.endswith(".key"):
+                    continue
+                try:
+                    key_id = bytes.fromhex(name[:-4])
+                except ValueError:
+                    continue
+                if key_id in self._keys or len(key_id) != self.KEY_ID_SIZE:
+                    continue
+                with open(os.path.join(self.key_dir, name)) as f:
+                    record = json.load(f)
+                self._add(key_id, base64.b64decode(record["key"]), record.get("event"), record["created"])
+    
+    def _add(self, key_id, key, event_name, created):
+        self._keys[key_id] = (AESGCM(key), event_name, created)
+        scope = event_name if self.mode == "event" else None
+        if self.mode == "rotating" and event_name is not None:
+            return
+        current = self._active.get(scope)
+        if current is None or (created, key_id) > (self._keys[current][2], current):
+            self._active[scope] = key_id
+    
+    def maybe_reload(self):
+        """Pick up keys added by other workers if the directory changed"""
+        if time.monotonic() - self._checked < self.reload_interval:
+            return
+        self._checked = time.monotonic()
+        if os.stat(self.key_dir).st_mtime_ns != self._dir_mtime:
+            self.reload()
+    
+    def get(self, key_id):
+        """AESGCM for a key id, or None if the key is unknown"""
+        entry = self._keys.get(key_id)
+        if entry is None:
+            self.reload()
+            entry = self._keys.get(key_id)
+        return entry[0] if entry else None
+    
+    def active_key(self, event_name=None):
+        """(key id, AESGCM) to encrypt new tickets for event_name with"""
+        self.maybe_reload()
+        scope = event_name if self.mode == "event" else None
+        key_id = self._active.get(scope)
+        if key_id is None:
+            return self.rotate(event_name)
+        if self.mode == "rotating" and self.rotate_after:
+            if time.time() - self._keys[key_id][2] >= self.rotate_after:
+                return self.rotate(event_name)
+        return key_id, self._keys[key_id][0]
+    
+    def rotate(self, event_name=None):
+        """Create and activate a new key. Returns (key id, AESGCM)"""
+        scope = event_name if self.mode == "event" else None
+        key = AESGCM.generate_key(bit_length=256)
+        created = int(time.time())
+        record = json.dumps({"key": base64.b64encode(key).decode(), "event": scope, "created": created})
+        with self._lock:
+            while True:
+                key_id = os.urandom(self.KEY_ID_SIZE)
+                path = os.path.join(self.key_dir, f"{key_id.hex()}.key")
+                try:
+                    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                except FileExistsError:
+                    continue
+                with os.fdopen(fd, "w") as f:
+                    f.write(record)
+                    f.flush()
+                    os.fsync(f.fileno())
+                break
+            # Newest key wins, even if an older one was loaded later
+            self._add(key_id, key, scope, created)
+            self._active[scope] = key_id
+        return key_id, self._keys[key_id][0]
+    
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "keys": len(self._keys),
+            "active": {scope or "*": key_id.hex() for scope, key_id in self._active.items()}
+        }
+
+# Ticket store schema
+# v1: original tickets table (+ qr_data); v2: epoch columns, events, archive, indexes
+SCHEMA_VERSION = 2
+# Largest create_tickets_batch request; bigger sales are issued in several calls
+MAX_BATCH_TICKETS = 10000
+# Most redemptions validate_tickets_stream commits in one group
+MAX_STREAM_BATCH = 1000
+TICKET_COLUMNS_ADDED = (
+    ("qr_data", "TEXT"),
+    ("issue_ts", "INTEGER"),
+    ("expiry_ts", "INTEGER"),
+    ("use_ts", "INTEGER")
+)
+
+INSERT_TICKET_SQL = '''
+    INSERT INTO tickets (ticket_id, event_name, issue_time, expiry_time, used, qr_data, issue_ts, expiry_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+REDEEM_TICKET_SQL = '''
+    UPDATE tickets SET used = 1, use_time = ?, use_ts = ?
+        WHERE ticket_id = ? AND used = 0 AND expiry_ts > ?
+'''
+
+def iso_to_epoch(value):
+    """Epoch seconds for a naive local-time ISO string"""
+    return int(datetime.fromisoformat(value[:26]).timestamp())
+
+@lru_cache(maxsize=65536)
+def legacy_expiry_epoch(expiry_time):
+    """iso_to_epoch for the expiry of tickets issued without expiry_ts.
+    
+    Cached: the same ticket (or a whole batch sharing one expiry) is
+    checked over and over. Only expiries go through here; issue and use
+    times are unique per ticket and would just push them out.
+    """
+    return iso_to_epoch(expiry_time)
+
+def ticket_expiry_ts(ticket_data):
+    """Expiry of a decrypted ticket as epoch seconds"""
+    expiry_ts = ticket_data.get("expiry_ts")
+    if expiry_ts is None:
+        return legacy_expiry_epoch(ticket_data["expiry_time"])
+    return expiry_ts
+
+# Validation outcome labels for metrics, keyed by rejection reason
+REASON_OUTCOMES = {
+    "Decryption failed - Invalid or tampered ticket": "decrypt_failed",
+    "Decryption failed - Unknown encryption key": "decrypt_failed",
+    "Signature verification failed - Ticket not authentic": "bad_signature",
+    "Ticket already used": "already_used",
+    "Ticket expired": "expired",
+    "Ticket not found in database": "not_found",
+    "Ticket not found in offline index": "not_found"
+}
+
+def outcome_label(result):
+    """Metrics label for a validate_ticket result"""
+    if result["valid"]:
+        return "valid"
+    return REASON_OUTCOMES.get(result["reason"], "error")
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "start")
+    
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class PipelineMetrics:
+    """Low-overhead per-stage histograms and outcome counters.
+    
+    Rendered in the Prometheus text exposition format by render(). A
+    disabled instance hands out a shared no-op timer.
+    """
+    
+    BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+               0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+    COUNTERS = {
+        "ticket_validations_total": ("outcome", "Ticket validations by outcome"),
+        "tickets_issued_total": (None, "Tickets issued")
+    }
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}  # stage -> [bucket counts..., sum, count]
+        self._counters = {}    # (name, label) -> value
+    
+    def stage(self, name):
+        """Context manager timing one pipeline stage"""
+        return _StageTimer(self, name) if self.enabled else _NULL_TIMER
+    
+    def observe(self, stage, seconds):
+        i = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = [0] * (len(self.BUCKETS) + 1) + [0.0, 0]
+            hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+    
+    def inc(self, name, label=None, value=1):
+        if not self.enabled:
+            return
+        key = (name, label)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def stage_totals(self):
+        """{stage: (observations, total seconds)} recorded so far"""
+        with self._lock:
+            return {stage: (hist[-1], hist[-2]) for stage, hist in self._histograms.items()}
+    
+    def render(self, gauges=None):
+        """Prometheus text format; gauges is an optional {name: value} dict"""
+        with self._lock:
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+            counters = dict(self._counters)
+        
+        lines = [
+            "# HELP ticket_stage_seconds Time spent in each ticket pipeline stage",
+            "# TYPE ticket_stage_seconds histogram"
+        ]
+        for stage in sorted(histograms):
+            hist = histograms[stage]
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS, hist):
+                cumulative += count
+                lines.append(f'ticket_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'ticket_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist[-1]}')
+            lines.append(f'ticket_stage_seconds_sum{{stage="{stage}"}} {hist[-2]:.6f}')
+            lines.append(f'ticket_stage_seconds_count{{stage="{stage}"}} {hist[-1]}')
+        
+        for name, (label_name, help_text) in self.COUNTERS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (counter, label), value in sorted(counters.items(), key=lambda kv: str(kv[0])):
+                if counter != name:
+                    continue
+                labels = f'{{{label_name}="{label}"}}' if label_name else ""
+                lines.append(f"{name}{labels} {value}")
+        
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+def init_schema(conn):
+    """Create or migrate the ticket tables in one database file"""
+    with conn:
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS tickets (
                 ticket_id TEXT PRIMARY KEY,
                 event_name TEXT,
                 issue_time TEXT,
                 expiry_time TEXT,
                 used BOOLEAN DEFAULT FALSE,
-                use_time TEXT
+                use_time TEXT,
+                qr_data TEXT,
+                issue_ts INTEGER,
+                expiry_ts INTEGER,
+                use_ts INTEGER
             )
         ''')
-        conn.commit()
-        conn.close()
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(tickets)')]
+        for column, column_type in TICKET_COLUMNS_ADDED:
+            if column not in columns:
+                conn.execute(f'ALTER TABLE tickets ADD COLUMN {column} {column_type}')
+        
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version < 2:
+            # Backfill epoch columns from the ISO text (stored as local time)
+            conn.execute('''
+                UPDATE tickets SET
+                    issue_ts = CAST(strftime('%s', issue_time, 'utc') AS INTEGER),
+                    expiry_ts = CAST(strftime('%s', expiry_time, 'utc') AS INTEGER),
+                    use_ts = CAST(strftime('%s', use_time, 'utc') AS INTEGER)
+                WHERE expiry_ts IS NULL
+            ''')
+        
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                event_id INTEGER PRIMARY KEY,
+                event_name TEXT UNIQUE NOT NULL,
+                created_ts INTEGER
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tickets_archive (
+                ticket_id TEXT PRIMARY KEY,
+                event_name TEXT,
+                issue_time TEXT,
+                expiry_time TEXT,
+                used BOOLEAN,
+                use_time TEXT,
+                qr_data TEXT,
+                issue_ts INTEGER,
+                expiry_ts INTEGER,
+                use_ts INTEGER,
+                archived_ts INTEGER
+            )
+        ''')
+        # Event reports (issued/redeemed/expired per event) are answered
+        # from idx_tickets_event alone; the sweeper walks idx_tickets_expiry
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_event ON tickets (event_name, used, expiry_ts)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_expiry ON tickets (expiry_ts)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_archive_event ON tickets_archive (event_name, used)')
+        
+        if version < 2:
+            conn.execute('''
+                INSERT OR IGNORE INTO events (event_name, created_ts)
+                    SELECT event_name, MIN(issue_ts) FROM tickets GROUP BY event_name
+            ''')
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def check_shard_layout(conn, path, layout):
+    """Record the layout in a new shard file, or refuse one from another layout"""
+    with conn:
+        conn.execute('CREATE TABLE IF NOT EXISTS shard_info (key TEXT PRIMARY KEY, value TEXT)')
+        stored = dict(conn.execute('SELECT key, value FROM shard_info'))
+        if not stored:
+            conn.executemany('INSERT INTO shard_info (key, value) VALUES (?, ?)', layout.items())
+        elif stored != layout:
+            raise ValueError(
+                f"{path} is shard {stored.get('shard')} of a {stored.get('shard_count')}-shard "
+                f"layout by {stored.get('shard_by')}; reshard it with shard_tickets.py"
+            )
+
+class SecureTicketingSystem:
+    def __init__(self, db_path="tickets.db", db_options=None, payload_format="binary", compress=True,
+                 signature_scheme="rsa-pss", verify_cache_options=None, qr_mode="file",
+                 render_cache_options=None, metrics_enabled=True, keyring_options=None,
+                 redemption_log_options=None, shards=1, shard_by="event", max_workers=None,
+                 gate_keys=None, embedded_keys=True):
+        self.backend = default_backend()
+        self.metrics = PipelineMetrics(metrics_enabled)
+        self.db_path = db_path
+        self.payload_format = payload_format  # "binary" or legacy "json"
+        self.compress = compress
+        # False refuses the old v1-v3 / JSON payloads that carry their own AES key
+        self.embedded_keys = embedded_keys
+        if signature_scheme not in SIGNERS:
+            raise ValueError(f"Unknown signature scheme: {signature_scheme}")
+        self.signature_scheme = signature_scheme
+        self.shards = TicketShards(self.db_path, shards, shard_by, db_options)
+        self.db = self.shards.databases[0]  # the only database unless sharded
+        self.init_database()
+        
+        # Cache of already verified QR payloads; max_entries=0 disables it
+        cache = VerifiedTicketCache(**(verify_cache_options or {}))
+        self.verify_cache = cache if cache.max_entries > 0 else None
+        
+        # Data-encryption keys referenced by id from every new QR payload
+        self.keyring = Keyring(**(keyring_options or {}))
+        
+        # Per-gate secrets for the offline index export and redemption sync
+        self.gate_keys = gate_keys or {}
+        
+        # Hash-chained audit log of every scan; None disables it
+        self.redemption_log = RedemptionLog(**redemption_log_options) if redemption_log_options else None
+        
+        # "file" writes ticket_<id>.png at issuance, "lazy" only renders on request
+        self.qr_mode = qr_mode
+        self.render_cache = LRUCache(**(render_cache_options or {"max_entries": 1000,
+                                                                 "max_bytes": 32 * 1024 * 1024}))
+        
+        # Load every known key pair, generating one for the active scheme if needed
+        self.load_keys()
+        if self.signer is None:
+            self.generate_keys()
+        
+        # One process pool for batch work, shared by all requests and started
+        # on first use; callers can ask for fewer workers, never more
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+    
+    def init_database(self):
+        """Initialize SQLite database for ticket tracking and migrate old schemas"""
+        for index, db in enumerate(self.shards.databases):
+            conn = db.connection()
+            init_schema(conn)
+            if self.shards.count > 1:
+                check_shard_layout(conn, db.db_path, self.shards.layout(index))
     
     def generate_keys(self):
-        """Generate RSA key pair for digital signatures"""
-        self.private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048,
-            backend=self.backend
-        )
-        self.public_key = self.private_key.public_key()
+        """Generate a key pair for the active signature scheme.
+        
+        The private key file is published with an atomic link, so when
+        several server workers start at once only one key pair wins and
+        the others load it.
+        """
+        signer = SIGNERS[self.signature_scheme].generate()
+        private_file, public_file = signer.key_files
         
         # Save keys to files
-        with open("private_key.pem", "wb") as f:
-            f.write(self.private_key.private_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            ))
-        
-        with open("public_key.pem", "wb") as f:
-            f.write(self.public_key.public_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo
-            ))
+        tmp_file = f"{private_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(signer.private_pem())
+        try:
+            os.link(tmp_file, private_file)
+        except FileExistsError:
+            # Another worker generated the key first
+            self.load_keys()
+            return
+        finally:
+            os.remove(tmp_file)
+        
+        with open(public_file, "wb") as f:
+            f.write(signer.public_pem())
+        
+        self.use_signer(signer)
     
     def load_keys(self):
-        """Load existing RSA key pair"""
-        with open("private_key.pem", "rb") as f:
-            self.private_key = serialization.load_pem_private_key(
-                f.read(), password=None, backend=self.backend
-            )
+        """Load existing key pairs for all signature schemes.
         
-        with open("public_key.pem", "rb") as f:
-            self.public_key = serialization.load_pem_public_key(
-                f.read(), backend=self.backend
-            )
+        Public keys are enough to verify old tickets; the active scheme
+        also needs its private key to sign new ones.
+        """
+        self.signers = {}
+        self.signer = None
+        for scheme, signer_cls in SIGNERS.items():
+            private_file, public_file = signer_cls.key_files
+            if os.path.exists(private_file):
+                with open(private_file, "rb") as f:
+                    private_key = serialization.load_pem_private_key(
+                        f.read(), password=None, backend=self.backend
+                    )
+                signer = signer_cls(private_key)
+            elif os.path.exists(public_file):
+                with open(public_file, "rb") as f:
+                    public_key = serialization.load_pem_public_key(
+                        f.read(), backend=self.backend
+                    )
+                signer = signer_cls(public_key=public_key)
+            else:
+                continue
+            
+            self.signers[signer.key_id] = signer
+            if scheme == self.signature_scheme and signer.private_key is not None:
+                self.use_signer(signer)
+    
+    def use_signer(self, signer):
+        """Make signer the one used for new tickets"""
+        self.signers[signer.key_id] = signer
+        self.signer = signer
+        self.private_key = signer.private_key
+        self.public_key = signer.public_key
     
     def parse_datetime_string(self, datetime_str):
-        """Parse datetime string - compatible with Python < 3.7"""
+        """Parse an ISO datetime string"""
         try:
-            # Simple approach: just take the first 19 characters
-            clean_str = datetime_str[:19]
-            return datetime.strptime(clean_str, '%Y-%m-%dT%H:%M:%S')
+            return datetime.fromisoformat(datetime_str[:26])
         except ValueError:
-            # Fallback: try with microseconds
-            try:
-                clean_str = datetime_str[:26]
-                return datetime.strptime(clean_str, '%Y-%m-%dT%H:%M:%S.%f')
-            except ValueError:
-                raise ValueError(f"Unable to parse datetime: {datetime_str}")
+            raise ValueError(f"Unable to parse datetime: {datetime_str}")
     
     def generate_aes_key(self):
         """Generate AES-256 key and IV"""
@@ -102,61 +1017,51 @@ class SecureTicketingSystem:
         iv = os.urandom(12)   # 96-bit IV for GCM
         return key, iv
     
-    def encrypt_data(self, data, key, iv):
-        """Encrypt data using AES-256-GCM"""
-        cipher = Cipher(
-            algorithms.AES(key),
-            modes.GCM(iv),
-            backend=self.backend
-        )
-        encryptor = cipher.encryptor()
-        ciphertext = encryptor.update(data.encode()) + encryptor.finalize()
-        return ciphertext, encryptor.tag
+    def encrypt_data(self, data, key, iv, associated_data=None):
+        """Encrypt bytes using one-shot AES-256-GCM.
+        
+        key is raw key bytes or an AESGCM from the keyring. Returns the
+        ciphertext with the 16-byte tag appended.
+        """
+        aead = key if isinstance(key, AESGCM) else AESGCM(key)
+        return aead.encrypt(iv, data, associated_data)
     
-    def decrypt_data(self, ciphertext, tag, key, iv):
-        """Decrypt data using AES-256-GCM"""
-        try:
-            cipher = Cipher(
-                algorithms.AES(key),
-                modes.GCM(iv, tag),
-                backend=self.backend
-            )
-            decryptor = cipher.decryptor()
-            plaintext = decryptor.update(ciphertext) + decryptor.finalize()
-            return plaintext.decode()
-        except Exception:
-            return None
+    def decrypt_data(self, ciphertext, key, iv, associated_data=None):
+        """Decrypt and authenticate ciphertext (tag appended) using AES-256-GCM.
+        
+        Raises InvalidTag if the ciphertext or associated data was altered.
+        """
+        aead = key if isinstance(key, AESGCM) else AESGCM(key)
+        return aead.decrypt(iv, ciphertext, associated_data)
     
     def sign_data(self, data):
-        """Sign data using RSA-PSS with SHA-256"""
-        signature = self.private_key.sign(
-            data.encode(),
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
-        return signature
+        """Sign data (bytes or str) with the active signature scheme"""
+        if isinstance(data, str):
+            data = data.encode()
+        return self.signer.sign(data)
     
-    def verify_signature(self, data, signature):
-        """Verify RSA-PSS signature"""
+    def verify_signature(self, data, signature, key_id=None):
+        """Verify a signature made by the key with the given id.
+        
+        Tickets without a key id predate pluggable signers and were signed
+        with the RSA-PSS key.
+        """
+        if key_id is None:
+            signer = next((s for s in self.signers.values() if s.scheme == "rsa-pss"), None)
+        else:
+            signer = self.signers.get(key_id)
+        if signer is None:
+            return False
+        if isinstance(data, str):
+            data = data.encode()
         try:
-            self.public_key.verify(
-                signature,
-                data.encode(),
-                padding.PSS(
-                    mgf=padding.MGF1(hashes.SHA256()),
-                    salt_length=padding.PSS.MAX_LENGTH
-                ),
-                hashes.SHA256()
-            )
+            signer.verify(signature, data)
             return True
         except Exception:
             return False
     
-    def create_ticket(self, event_name, holder_name, seat_number, valid_hours=24):
-        """Create a secure ticket"""
+    def build_ticket_data(self, event_name, holder_name, seat_number, valid_hours=24):
+        """Build the plaintext ticket record for a new ticket"""
         # Generate unique ticket ID
         ticket_id = str(uuid.uuid4())
         
@@ -164,128 +1069,929 @@ class SecureTicketingSystem:
         issue_time = datetime.now()
         expiry_time = issue_time + timedelta(hours=valid_hours)
         
-        ticket_data = {
+        return {
             "ticket_id": ticket_id,
             "event_name": event_name,
             "holder_name": holder_name,
             "seat_number": seat_number,
             "issue_time": issue_time.isoformat(),
             "expiry_time": expiry_time.isoformat(),
+            "expiry_ts": int(expiry_time.timestamp()),  # signed, checked without parsing
             "nonce": os.urandom(16).hex()  # Additional uniqueness
         }
+    
+    def seal_ticket(self, ticket_data, dek_id=None):
+        """Encrypt and sign ticket data, returning the QR payload string.
         
-        # Store in database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO tickets (ticket_id, event_name, issue_time, expiry_time, used)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (ticket_id, event_name, issue_time.isoformat(), expiry_time.isoformat(), False))
-        conn.commit()
-        conn.close()
-        
+        The payload is encrypted with the keyring key dek_id, by default the
+        active key for the ticket's event; only the key id goes in the QR.
+        """
         # Convert to JSON and encrypt
-        ticket_json = json.dumps(ticket_data)
-        aes_key, iv = self.generate_aes_key()
-        ciphertext, tag = self.encrypt_data(ticket_json, aes_key, iv)
+        metrics = self.metrics
+        with metrics.stage("encode"):
+            ticket_json = json.dumps(ticket_data, separators=(",", ":")).encode()
+        if dek_id is None:
+            dek_id, dek = self.keyring.active_key(ticket_data["event_name"])
+        else:
+            dek = self.keyring.get(dek_id)
+        iv = os.urandom(12)
         
         # Create signature of the original data
-        signature = self.sign_data(ticket_json)
+        with metrics.stage("sign"):
+            signature = self.sign_data(ticket_json)
         
-        # Combine everything for QR code
+        if self.payload_format == "binary":
+            with metrics.stage("encrypt"):
+                plaintext = ticket_json
+                flags = 0
+                if self.compress:
+                    compressed = zlib.compress(plaintext, 9)
+                    if len(compressed) < len(plaintext):
+                        plaintext = compressed
+                        flags |= PAYLOAD_FLAG_COMPRESSED
+                header = PAYLOAD_HEADERS[PAYLOAD_VERSION].pack(
+                    PAYLOAD_VERSION, flags, self.signer.key_id, dek_id, iv, len(signature)
+                )
+                aad = header[:PAYLOAD_AAD_SIZES[PAYLOAD_VERSION]]
+                ciphertext = self.encrypt_data(plaintext, dek, iv, aad)
+            return b45encode(header + signature + ciphertext)
+        
+        # Legacy JSON envelope (no associated data)
+        with metrics.stage("encrypt"):
+            sealed = self.encrypt_data(ticket_json, dek, iv)
+            ciphertext, tag = sealed[:-GCM_TAG_SIZE], sealed[-GCM_TAG_SIZE:]
         qr_payload = {
             "ciphertext": base64.b64encode(ciphertext).decode(),
             "tag": base64.b64encode(tag).decode(),
             "iv": base64.b64encode(iv).decode(),
-            "key": base64.b64encode(aes_key).decode(),
-            "signature": base64.b64encode(signature).decode()
+            "dek": dek_id.hex(),
+            "signature": base64.b64encode(signature).decode(),
+            "kid": self.signer.key_id.hex()
         }
-        
-        # Generate QR code
-        qr_data = json.dumps(qr_payload)
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
+        return json.dumps(qr_payload)
+    
+    def make_qr_image(self, qr_data, box_size=10, border=5):
+        """Build the QR code image for a payload"""
+        qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
         qr.add_data(qr_data)
         qr.make(fit=True)
-        
-        qr_image = qr.make_image(fill_color="black", back_color="white")
+        return qr.make_image(fill_color="black", back_color="white")
+    
+    def render_qr(self, qr_data, ticket_id):
+        """Render QR payload to a PNG file and return its filename"""
+        with self.metrics.stage("qr_make"):
+            qr_image = self.make_qr_image(qr_data)
         qr_filename = f"ticket_{ticket_id}.png"
-        qr_image.save(qr_filename)
+        with self.metrics.stage("png_save"):
+            qr_image.save(qr_filename)
+        return qr_filename
+    
+    def qr_token(self, ticket_id):
+        """Token that unlocks /tickets/<id>/qr.<format>; only handed out at issuance.
+        
+        A QR image carries the full bearer payload, so knowing a ticket id
+        (e.g. from the redemption index) must not be enough to fetch it.
+        """
+        digest = hmac.new(self.keyring.link_key(), ticket_id.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:16]).rstrip(b"=").decode()
+    
+    def check_qr_token(self, ticket_id, token):
+        return hmac.compare_digest(self.qr_token(ticket_id), token or "")
+    
+    def qr_url(self, ticket_id):
+        return f"/tickets/{ticket_id}/qr.png?token={self.qr_token(ticket_id)}"
+    
+    def render_qr_bytes(self, ticket_id, box_size=10, border=5, image_format="png"):
+        """Render a stored ticket's QR code in memory.
+        
+        Returns the encoded image bytes, or None if the ticket (or its
+        payload) is unknown. Recent renders are kept in a bounded cache.
+        """
+        if image_format not in QR_IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        cache_key = (ticket_id, box_size, border, image_format)
+        data = self.render_cache.get(cache_key)
+        if data is not None:
+            return data
+        
+        row = self.shards.locate(ticket_id).connection().execute(
+            'SELECT qr_data FROM tickets WHERE ticket_id = ?', (ticket_id,)
+        ).fetchone()
+        if not row or not row[0]:
+            return None
+        
+        with self.metrics.stage("qr_make"):
+            image = self.make_qr_image(row[0], box_size, border).get_image()
+        with self.metrics.stage("png_save"):
+            if image_format == "webp":
+                image = image.convert("L")
+            buf = io.BytesIO()
+            image.save(buf, format=image_format.upper())
+        data = buf.getvalue()
+        self.render_cache.put(cache_key, data)
+        return data
+    
+    def ticket_row(self, ticket_data, qr_data):
+        """Parameters for INSERT_TICKET_SQL"""
+        return (ticket_data["ticket_id"], ticket_data["event_name"],
+                ticket_data["issue_time"], ticket_data["expiry_time"], False, qr_data,
+                iso_to_epoch(ticket_data["issue_time"]), ticket_expiry_ts(ticket_data))
+    
+    def register_event(self, conn, event_name):
+        conn.execute('INSERT OR IGNORE INTO events (event_name, created_ts) VALUES (?, ?)',
+                     (event_name, int(time.time())))
+    
+    def store_tickets(self, event_name, rows):
+        """Insert INSERT_TICKET_SQL rows for one event, one transaction per shard"""
+        shards = self.shards
+        event_db = shards.for_event(event_name)
+        groups = {}
+        for row in rows:
+            groups.setdefault(shards.for_ticket(row[0], event_name), []).append(row)
+        if event_db not in groups:
+            conn = event_db.connection()
+            with conn:
+                self.register_event(conn, event_name)
+        for db, group in groups.items():
+            conn = db.connection()
+            with conn:
+                if db is event_db:
+                    self.register_event(conn, event_name)
+                conn.executemany(INSERT_TICKET_SQL, group)
+    
+    def create_ticket(self, event_name, holder_name, seat_number, valid_hours=24):
+        """Create a secure ticket"""
+        ticket_data = self.build_ticket_data(event_name, holder_name, seat_number, valid_hours)
+        ticket_id = ticket_data["ticket_id"]
+        
+        # Encrypt and sign
+        qr_data = self.seal_ticket(ticket_data)
+        
+        # Store in database
+        with self.metrics.stage("db_insert"):
+            self.store_tickets(event_name, [self.ticket_row(ticket_data, qr_data)])
+        self.metrics.inc("tickets_issued_total")
+        
+        # Generate QR code file unless images are rendered on request
+        qr_filename = self.render_qr(qr_data, ticket_id) if self.qr_mode == "file" else None
         
         return {
             "ticket_id": ticket_id,
+            "qr_data": qr_data,
             "qr_filename": qr_filename,
+            "qr_url": self.qr_url(ticket_id),
             "ticket_data": ticket_data
         }
     
-    def validate_ticket(self, qr_data):
-        """Validate a ticket from QR code data"""
+    def create_tickets_batch(self, event_name, holders, valid_hours=24, workers=None, render=None):
+        """Create many tickets at once.
+        
+        holders is a list of {"holder_name": ..., "seat_number": ...} dicts.
+        Signing and QR rendering are spread over a process pool and all rows
+        are written in a single transaction. render defaults to writing PNG
+        files only in "file" QR mode.
+        """
+        if len(holders) > MAX_BATCH_TICKETS:
+            raise ValueError(f"At most {MAX_BATCH_TICKETS} tickets per batch")
+        if render is None:
+            render = self.qr_mode == "file"
+        start = time.perf_counter()
+        tickets = [
+            self.build_ticket_data(event_name, h["holder_name"], h["seat_number"], valid_hours)
+            for h in holders
+        ]
+        
+        # Pick (or create) the key up front so every worker uses the same one
+        dek_id, _ = self.keyring.active_key(event_name)
+        workers = self.clamp_workers(workers)
+        chunksize = max(1, len(tickets) // (workers * 4))
+        with self.metrics.stage("batch_seal"):
+            sealed = self.map_in_pool(_seal_ticket_worker,
+                                      [(t, render, dek_id) for t in tickets],
+                                      chunksize=chunksize)
+        
+        # Store all tickets in one transaction (per shard)
+        with self.metrics.stage("batch_db_insert"):
+            self.store_tickets(event_name, [self.ticket_row(t, qr_data)
+                                            for t, (qr_data, _) in zip(tickets, sealed)])
+        self.metrics.inc("tickets_issued_total", value=len(tickets))
+        
+        elapsed = time.perf_counter() - start
+        results = [
+            {"ticket_id": t["ticket_id"], "qr_data": qr_data,
+             "qr_filename": qr_filename, "qr_url": self.qr_url(t["ticket_id"]),
+             "ticket_data": t}
+            for t, (qr_data, qr_filename) in zip(tickets, sealed)
+        ]
+        return {
+            "count": len(results),
+            "elapsed_seconds": round(elapsed, 3),
+            "tickets_per_second": round(len(results) / elapsed, 1) if elapsed else None,
+            "tickets": results
+        }
+    
+    def clamp_workers(self, workers):
+        """A caller's requested worker count, limited to the server's max_workers"""
         try:
-            # Parse QR payload
+            workers = int(workers or self.max_workers)
+        except (TypeError, ValueError):
+            workers = self.max_workers
+        return min(max(workers, 1), self.max_workers)
+    
+    def shared_pool(self):
+        """The system's process pool, started on first use (again after fork)"""
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = self.worker_pool(self.max_workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+    
+    def map_in_pool(self, func, items, chunksize=1):
+        """pool.map on the shared pool, replacing the pool if a worker died"""
+        try:
+            return list(self.shared_pool().map(func, items, chunksize=chunksize))
+        except BrokenProcessPool:
+            self.close_pool()
+            raise
+    
+    def close_pool(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pool_pid == os.getpid():
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def worker_pool(self, workers=None):
+        """Process pool whose workers carry this system's key material"""
+        key_state = {
+            "signature_scheme": self.signature_scheme,
+            "private_pem": self.signer.private_pem(),
+            "public_pems": [(s.scheme, s.public_pem()) for s in self.signers.values()],
+            "payload_format": self.payload_format,
+            "compress": self.compress,
+            "embedded_keys": self.embedded_keys,
+            "keyring_options": self.keyring.options()
+        }
+        return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                   initializer=_init_batch_worker,
+                                   initargs=(key_state,))
+    
+    def redeem_ticket(self, ticket_id, now=None, event_name=None):
+        """Mark a ticket as used if it exists, is unused and has not expired.
+        
+        The check and the state change happen in one conditional UPDATE, so
+        two concurrent scans of the same ticket can never both succeed.
+        now is an epoch time (default: time.time()); event_name routes the
+        update to its shard directly. Returns (redeemed, reason).
+        """
+        if now is None:
+            now = time.time()
+        now_ts = int(now)
+        now = datetime.fromtimestamp(now)
+        conn = self.shards.for_ticket(ticket_id, event_name).connection()
+        with self.metrics.stage("db_redeem"), conn:
+            cursor = conn.execute(REDEEM_TICKET_SQL, (now.isoformat(), now_ts, ticket_id, now_ts))
+        if cursor.rowcount == 1:
+            return True, None
+        return False, self.rejection_reason(conn, ticket_id)
+    
+    def redeem_tickets(self, ticket_ids, event_names=None):
+        """Redeem a group of tickets in one transaction per shard.
+        
+        event_names, if given, lists each ticket's event for routing.
+        Returns a (redeemed, reason) pair per ticket id, in order.
+        """
+        now = datetime.now()
+        now_iso, now_ts = now.isoformat(), int(now.timestamp())
+        event_names = event_names or [None] * len(ticket_ids)
+        groups = {}
+        for i, (ticket_id, event_name) in enumerate(zip(ticket_ids, event_names)):
+            groups.setdefault(self.shards.for_ticket(ticket_id, event_name), []).append(i)
+        results = [None] * len(ticket_ids)
+        for db, indexes in groups.items():
+            conn = db.connection()
+            with conn:
+                for i in indexes:
+                    ticket_id = ticket_ids[i]
+                    cursor = conn.execute(REDEEM_TICKET_SQL, (now_iso, now_ts, ticket_id, now_ts))
+                    if cursor.rowcount == 1:
+                        results[i] = (True, None)
+                    else:
+                        results[i] = (False, self.rejection_reason(conn, ticket_id))
+        return results
+    
+    def check_tickets(self, ticket_ids, event_names=None):
+        """Report whether tickets could be redeemed now, without redeeming them.
+        
+        Same (redeemed, reason) pairs as redeem_tickets, but read-only: used
+        to check tickets (e.g. a folder of emailed ones) without burning them.
+        """
+        now_ts = int(time.time())
+        event_names = event_names or [None] * len(ticket_ids)
+        results = []
+        for ticket_id, event_name in zip(ticket_ids, event_names):
+            conn = self.shards.for_ticket(ticket_id, event_name).connection()
+            row = conn.execute(
+                'SELECT used, expiry_ts FROM tickets WHERE ticket_id = ?', (ticket_id,)
+            ).fetchone()
+            if row and not row[0] and row[1] > now_ts:
+                results.append((True, None))
+            else:
+                results.append((False, self.rejection_reason(conn, ticket_id)))
+        return results
+    
+    def rejection_reason(self, conn, ticket_id):
+        """Slow path: work out why a conditional redeem matched no row"""
+        db_ticket = conn.execute(
+            'SELECT used, expiry_ts FROM tickets WHERE ticket_id = ?', (ticket_id,)
+        ).fetchone()
+        if not db_ticket:
+            archived = conn.execute(
+                'SELECT 1 FROM tickets_archive WHERE ticket_id = ?', (ticket_id,)
+            ).fetchone()
+            return "Ticket expired" if archived else "Ticket not found in database"
+        if db_ticket[0]:
+            return "Ticket already used"
+        return "Ticket expired"
+    
+    def parse_payload(self, qr_data):
+        """Split QR data (binary or legacy JSON) into its components"""
+        payload = self._parse_payload(qr_data)
+        if payload["key"] is not None and not self.embedded_keys:
+            raise ValueError("Ticket format with an embedded key is no longer accepted")
+        return payload
+    
+    def _parse_payload(self, qr_data):
+        qr_data = qr_data.strip()
+        if qr_data.startswith("{"):
             qr_payload = json.loads(qr_data)
+            return {
+                "ciphertext": (base64.b64decode(qr_payload["ciphertext"])
+                               + base64.b64decode(qr_payload["tag"])),
+                "iv": base64.b64decode(qr_payload["iv"]),
+                "key": base64.b64decode(qr_payload["key"]) if "key" in qr_payload else None,
+                "dek_id": bytes.fromhex(qr_payload["dek"]) if "dek" in qr_payload else None,
+                "signature": base64.b64decode(qr_payload["signature"]),
+                "key_id": bytes.fromhex(qr_payload["kid"]) if "kid" in qr_payload else None,
+                "compressed": False,
+                "aad": None
+            }
+        
+        blob = b45decode(qr_data)
+        header = PAYLOAD_HEADERS.get(blob[0]) if blob else None
+        if header is None:
+            raise ValueError("Unsupported payload version")
+        if len(blob) < header.size:
+            raise ValueError("Truncated ticket payload")
+        tag = b""
+        key = dek_id = None
+        if blob[0] == 1:
+            version, flags, iv, tag, key, sig_len = header.unpack_from(blob)
+            key_id = None
+        elif blob[0] == 2:
+            version, flags, key_id, iv, tag, key, sig_len = header.unpack_from(blob)
+        elif blob[0] == 3:
+            version, flags, key_id, iv, key, sig_len = header.unpack_from(blob)
+        else:
+            version, flags, key_id, dek_id, iv, sig_len = header.unpack_from(blob)
+        aad = blob[:PAYLOAD_AAD_SIZES[blob[0]]] if blob[0] in PAYLOAD_AAD_SIZES else None
+        sig_end = header.size + sig_len
+        if len(blob) < sig_end:
+            raise ValueError("Truncated ticket payload")
+        return {
+            "ciphertext": blob[sig_end:] + tag,
+            "iv": iv,
+            "key": key,
+            "dek_id": dek_id,
+            "signature": blob[header.size:sig_end],
+            "key_id": key_id,
+            "compressed": bool(flags & PAYLOAD_FLAG_COMPRESSED),
+            "aad": aad
+        }
+    
+    def open_ticket(self, qr_data):
+        """Decrypt and authenticate QR data.
+        
+        Returns (ticket_data, None) or (None, reason) for a forged or
+        tampered ticket. Malformed payloads raise. Results are served from
+        the verified-ticket cache when the same QR string was seen before.
+        """
+        cache = self.verify_cache
+        if cache is None:
+            return self.open_ticket_uncached(qr_data)
+        
+        digest = hashlib.sha256(qr_data.encode()).digest()
+        result = cache.get(digest)
+        if result is None:
+            result = self.open_ticket_uncached(qr_data)
+            cache.put(digest, result)
+        ticket_data, reason = result
+        return (dict(ticket_data) if ticket_data else None), reason
+    
+    def open_ticket_uncached(self, qr_data):
+        """Decrypt and authenticate QR data without consulting the cache"""
+        metrics = self.metrics
+        
+        # Parse QR payload
+        with metrics.stage("parse"):
+            payload = self.parse_payload(qr_data)
+        
+        # Decrypt ticket data
+        with metrics.stage("decrypt"):
+            key = payload["key"]
+            if payload["dek_id"] is not None:
+                key = self.keyring.get(payload["dek_id"])
+                if key is None:
+                    return None, "Decryption failed - Unknown encryption key"
+            try:
+                plaintext = self.decrypt_data(payload["ciphertext"], key,
+                                              payload["iv"], payload["aad"])
+            except InvalidTag:
+                return None, "Decryption failed - Invalid or tampered ticket"
+            if payload["compressed"]:
+                plaintext = zlib.decompress(plaintext)
+        
+        # Verify signature
+        with metrics.stage("verify"):
+            authentic = self.verify_signature(plaintext, payload["signature"], payload["key_id"])
+        if not authentic:
+            return None, "Signature verification failed - Ticket not authentic"
+        
+        # Parse decrypted data
+        with metrics.stage("decode"):
+            return json.loads(plaintext), None
+    
+    def validate_ticket(self, qr_data, gate=None):
+        """Validate a ticket from QR code data.
+        
+        gate names the scanning device in the redemption log. A successful
+        redemption is only reported once its log record is on disk; if it
+        cannot be written the redemption is undone and the scan rejected.
+        """
+        with self.metrics.stage("validate"):
+            result, ticket_id = self._validate_ticket(qr_data)
+            try:
+                self.log_scans([(ticket_id, result, gate, None)])
+            except Exception as e:
+                if result["valid"]:
+                    result = {"valid": False, "reason": f"Validation error: {str(e)}"}
+        self.metrics.inc("ticket_validations_total", outcome_label(result))
+        return result
+    
+    def _validate_ticket(self, qr_data):
+        """Returns (result, ticket id or None if the QR could not be opened)"""
+        ticket_id = None
+        try:
+            now = time.time()
+            ticket_data, reason = self.open_ticket(qr_data)
+            if ticket_data is None:
+                return {"valid": False, "reason": reason}, None
+            ticket_id = ticket_data["ticket_id"]
             
-            # Extract components
-            ciphertext = base64.b64decode(qr_payload["ciphertext"])
-            tag = base64.b64decode(qr_payload["tag"])
-            iv = base64.b64decode(qr_payload["iv"])
-            key = base64.b64decode(qr_payload["key"])
-            signature = base64.b64decode(qr_payload["signature"])
-            
-            # Decrypt ticket data
-            decrypted_data = self.decrypt_data(ciphertext, tag, key, iv)
-            if not decrypted_data:
-                return {"valid": False, "reason": "Decryption failed - Invalid or tampered ticket"}
-            
-            # Verify signature
-            if not self.verify_signature(decrypted_data, signature):
-                return {"valid": False, "reason": "Signature verification failed - Ticket not authentic"}
+            # Expired tickets are rejected before touching the database
+            if ticket_expiry_ts(ticket_data) <= now:
+                return {"valid": False, "reason": "Ticket expired"}, ticket_id
             
-            # Parse decrypted data
-            ticket_data = json.loads(decrypted_data)
-            ticket_id = ticket_data["ticket_id"]
+            # Atomically check and redeem the ticket
+            redeemed, reason = self.redeem_ticket(ticket_id, now, ticket_data.get("event_name"))
+            if not redeemed:
+                return {"valid": False, "reason": reason}, ticket_id
             
-            # Check database for ticket existence and usage
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM tickets WHERE ticket_id = ?', (ticket_id,))
-            db_ticket = cursor.fetchone()
+            return {
+                "valid": True,
+                "ticket_data": ticket_data,
+                "message": "Ticket validated successfully"
+            }, ticket_id
             
-            if not db_ticket:
-                conn.close()
-                return {"valid": False, "reason": "Ticket not found in database"}
+        except Exception as e:
+            return {"valid": False, "reason": f"Validation error: {str(e)}"}, ticket_id
+    
+    def log_scans(self, scans):
+        """Append (ticket_id, result, gate, ts) scans to the redemption log.
+        
+        Waits for the group commit when a scan redeemed a ticket; rejected
+        scans are written in the background. If the append fails, the
+        redemptions among the scans (already committed to the database)
+        are undone before the error is raised, so tickets.used never holds
+        a redemption the log is missing.
+        """
+        log = self.redemption_log
+        if log is None or not scans:
+            return
+        entries = [(ticket_id, outcome_label(result), gate, result.get("reason"), ts)
+                   for ticket_id, result, gate, ts in scans]
+        try:
+            with self.metrics.stage("log_commit"):
+                log.append_many(entries, wait=any(result["valid"] for _, result, _, _ in scans))
+        except Exception:
+            self.release_tickets([ticket_id for ticket_id, result, _, _ in scans if result["valid"]])
+            raise
+    
+    def release_tickets(self, ticket_ids):
+        """Mark redeemed tickets unused again (their log record could not be written)"""
+        for ticket_id in ticket_ids:
+            conn = self.shards.locate(ticket_id).connection()
+            with conn:
+                conn.execute('''
+                    UPDATE tickets SET used = 0, use_time = NULL, use_ts = NULL
+                        WHERE ticket_id = ? AND used = 1
+                ''', (ticket_id,))
+    
+    def validate_tickets_stream(self, lines, workers=None, batch_size=200, max_in_flight=None,
+                                redeem=True):
+        """Validate a stream of NDJSON scan records, yielding results as they finish.
+        
+        Each line is {"qr_data": ..., "gate": optional}. Decryption and signature checks run
+        in a process pool, and the resulting redemptions are committed in
+        groups of up to batch_size. At most max_in_flight scans are held
+        at once, so memory stays flat whatever the input size. With
+        redeem=False tickets are only checked: nothing is marked used and
+        nothing is written to the redemption log.
+        
+        The work runs on the system's shared pool; workers (clamped to
+        max_workers) and batch_size (1..MAX_STREAM_BATCH) only size the
+        in-flight window and the commit groups.
+        """
+        workers = self.clamp_workers(workers)
+        batch_size = min(max(int(batch_size or 1), 1), MAX_STREAM_BATCH)
+        max_in_flight = min(max_in_flight or workers * 64, self.max_workers * 64)
+        in_flight = set()
+        opened = deque()
+        
+        def flush():
+            group = [opened.popleft() for _ in range(len(opened))]
+            apply = self.redeem_tickets if redeem else self.check_tickets
+            redeemed = apply([ticket_data["ticket_id"] for _, ticket_data, _ in group],
+                             [ticket_data.get("event_name") for _, ticket_data, _ in group])
+            results, scans = [], []
+            for (line_no, ticket_data, gate), (ok, reason) in zip(group, redeemed):
+                result = {"line": line_no, "valid": ok, "ticket_id": ticket_data["ticket_id"]}
+                if not ok:
+                    result["reason"] = reason
+                results.append(result)
+                scans.append((ticket_data["ticket_id"], result, gate, None))
+            if redeem:
+                # One group commit covers the whole batch of redemptions
+                try:
+                    self.log_scans(scans)
+                except Exception as e:
+                    # log_scans undid the redemptions: report them as failed
+                    for result in results:
+                        if result["valid"]:
+                            result.update(valid=False, reason=f"Validation error: {str(e)}")
+                for result in results:
+                    self.metrics.inc("ticket_validations_total", outcome_label(result))
+            yield from results
+        
+        def collect(done):
+            for future in done:
+                line_no = future.line_no
+                try:
+                    ticket_data, reason = future.result()
+                except BrokenProcessPool as e:
+                    self.close_pool()
+                    ticket_data, reason = None, f"Validation error: {str(e)}"
+                except Exception as e:
+                    ticket_data, reason = None, f"Validation error: {str(e)}"
+                ticket_id = ticket_data["ticket_id"] if ticket_data is not None else None
+                if ticket_data is not None and ticket_expiry_ts(ticket_data) <= time.time():
+                    ticket_data, reason = None, "Ticket expired"
+                if ticket_data is None:
+                    result = {"line": line_no, "valid": False, "reason": reason}
+                    if redeem:
+                        self.log_scans([(ticket_id, result, future.gate, None)])
+                        self.metrics.inc("ticket_validations_total", outcome_label(result))
+                    yield result
+                else:
+                    opened.append((line_no, ticket_data, future.gate))
+            if len(opened) >= batch_size:
+                yield from flush()
+        
+        try:
+            for line_no, line in enumerate(lines, 1):
+                if isinstance(line, bytes):
+                    line = line.decode()
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    qr_data = record["qr_data"]
+                except Exception as e:
+                    yield {"line": line_no, "valid": False, "reason": f"Bad record: {str(e)}"}
+                    continue
+                
+                future = self.shared_pool().submit(_open_ticket_worker, qr_data)
+                future.line_no = line_no
+                future.gate = record.get("gate")
+                in_flight.add(future)
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    yield from collect(done)
             
-            if db_ticket[5]:  # used column
-                conn.close()
-                return {"valid": False, "reason": "Ticket already used"}
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+        finally:
+            # A client that disconnects mid-stream leaves nothing queued on the shared pool
+            for future in in_flight:
+                future.cancel()
+        if opened:
+            yield from flush()
+    
+    def validate_ticket_offline(self, qr_data, index, gate=None):
+        """Validate against a RedemptionIndex instead of the database.
+        
+        Used by gate devices that cannot reach the server; the redemption
+        is journaled in the index and synced back later.
+        """
+        try:
+            ticket_data, reason = self.open_ticket(qr_data)
+            if ticket_data is None:
+                return {"valid": False, "reason": reason}
             
-            # Check expiry using our compatible method
-            expiry_time = self.parse_datetime_string(ticket_data["expiry_time"])
-            if datetime.now() > expiry_time:
-                conn.close()
+            if ticket_expiry_ts(ticket_data) <= time.time():
                 return {"valid": False, "reason": "Ticket expired"}
             
-            # Mark ticket as used
-            cursor.execute('''
-                    UPDATE tickets SET used = 1, use_time = ?
-                        WHERE ticket_id = ?
-                ''',(datetime.now().isoformat(), ticket_id))
-
-            conn.commit()
-            conn.close()
+            redeemed, reason = index.redeem(ticket_data["ticket_id"], gate)
+            if not redeemed:
+                return {"valid": False, "reason": reason}
             
             return {
                 "valid": True,
                 "ticket_data": ticket_data,
-                "message": "Ticket validated successfully"
+                "message": "Ticket validated offline"
             }
-            
+        
         except Exception as e:
             return {"valid": False, "reason": f"Validation error: {str(e)}"}
+    
+    def export_redemption_index(self, event_name=None):
+        """Snapshot the tickets table as a redemption index (bytes)"""
+        rows = []
+        if event_name is None:
+            for db in self.shards.databases:
+                rows.extend(db.connection().execute('SELECT ticket_id, used FROM tickets'))
+        else:
+            for db in self.shards.event_databases(event_name):
+                rows.extend(db.connection().execute(
+                    'SELECT ticket_id, used FROM tickets WHERE event_name = ?', (event_name,)))
+        return build_index(rows)
+    
+    def sync_redemptions(self, redemptions, gate=None):
+        """Apply journaled offline redemptions in one transaction per shard.
+        
+        With gate, only entries signed with that gate's key are applied
+        (the others are listed as unauthenticated); the HTTP endpoint always
+        passes the authenticated gate. Returns the number applied, the
+        ticket ids that were already used on the server (e.g. redeemed at
+        two offline gates), and those the server does not know or has
+        already archived as expired.
+        """
+        unauthenticated = []
+        if gate is not None:
+            key = self.gate_keys[gate]
+            signed = []
+            for entry in redemptions:
+                entry = {**entry, "gate": entry.get("gate") or gate}
+                if entry["gate"] == gate and hmac.compare_digest(
+                        entry_signature(key, entry), str(entry.get("sig", ""))):
+                    signed.append(entry)
+                else:
+                    unauthenticated.append(entry.get("ticket_id"))
+            redemptions, received = signed, len(redemptions)
+        else:
+            received = len(redemptions)
+        groups = {}
+        for entry in redemptions:
+            groups.setdefault(self.shards.locate(entry["ticket_id"]), []).append(entry)
+        conflicts = []
+        rejected = {"Ticket not found in database": [], "Ticket expired": []}
+        scans = []
+        for db, entries in groups.items():
+            conn = db.connection()
+            with conn:
+                for entry in entries:
+                    use_ts = iso_to_epoch(entry["use_time"])
+                    cursor = conn.execute('''
+                        UPDATE tickets SET used = 1, use_time = ?, use_ts = ?
+                            WHERE ticket_id = ? AND used = 0
+                    ''', (entry["use_time"], use_ts, entry["ticket_id"]))
+                    if cursor.rowcount == 1:
+                        result = {"valid": True}
+                    else:
+                        reason = self.rejection_reason(conn, entry["ticket_id"])
+                        rejected.get(reason, conflicts).append(entry["ticket_id"])
+                        result = {"valid": False, "reason": reason}
+                    scans.append((entry["ticket_id"], result, entry.get("gate"), use_ts))
+        self.log_scans(scans)
+        unknown, expired = rejected.values()
+        return {
+            "received": received,
+            "applied": len(redemptions) - len(conflicts) - len(unknown) - len(expired),
+            "conflicts": conflicts,
+            "unknown": unknown,
+            "expired": expired,
+            "unauthenticated": unauthenticated
+        }
+    
+    def event_stats(self, event_name):
+        """Issued/redeemed/expired counts for one event, or None if unknown.
+        
+        Served entirely from idx_tickets_event, so the cost depends on the
+        size of the event rather than the whole table.
+        """
+        event = self.shards.for_event(event_name).connection().execute(
+            'SELECT event_id, created_ts FROM events WHERE event_name = ?', (event_name,)
+        ).fetchone()
+        if event is None:
+            return None
+        
+        now = int(time.time())
+        issued = redeemed = expired_unused = archived = archived_redeemed = 0
+        for db in self.shards.event_databases(event_name):
+            conn = db.connection()
+            counts = conn.execute('''
+                SELECT COUNT(*),
+                       COALESCE(SUM(used = 1), 0),
+                       COALESCE(SUM(used = 0 AND expiry_ts <= ?), 0)
+                FROM tickets WHERE event_name = ?
+            ''', (now, event_name)).fetchone()
+            archive_counts = conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(used = 1), 0)
+                FROM tickets_archive WHERE event_name = ?
+            ''', (event_name,)).fetchone()
+            issued += counts[0]
+            redeemed += counts[1]
+            expired_unused += counts[2]
+            archived += archive_counts[0]
+            archived_redeemed += archive_counts[1]
+        return {
+            "event_name": event_name,
+            "event_id": event[0],
+            "created_ts": event[1],
+            "issued": issued + archived,
+            "redeemed": redeemed + archived_redeemed,
+            "active": issued - redeemed - expired_unused,
+            "expired_unused": expired_unused,
+            "archived": archived
+        }
+    
+    def sweep_expired(self, grace_seconds=7 * 24 * 3600, chunk_size=5000, max_chunks=None, pause=0.0):
+        """Move tickets that expired more than grace_seconds ago to tickets_archive.
+        
+        Works in chunks of chunk_size rows, each in its own short
+        transaction, so validation is never locked out for long. Shards
+        are swept one after another; max_chunks counts across all of them.
+        Returns the number of rows archived.
+        """
+        if grace_seconds < 0:
+            raise ValueError("grace_seconds must not be negative")
+        cutoff = int(time.time()) - grace_seconds
+        archived = 0
+        chunks = 0
+        for db in self.shards.databases:
+            conn = db.connection()
+            while max_chunks is None or chunks < max_chunks:
+                with self.metrics.stage("sweep_chunk"), conn:
+                    rowids = [row[0] for row in conn.execute(
+                        'SELECT rowid FROM tickets WHERE expiry_ts < ? ORDER BY expiry_ts LIMIT ?',
+                        (cutoff, chunk_size)
+                    )]
+                    if not rowids:
+                        break
+                    placeholders = ",".join("?" * len(rowids))
+                    conn.execute(f'''
+                        INSERT OR REPLACE INTO tickets_archive
+                            SELECT ticket_id, event_name, issue_time, expiry_time, used, use_time,
+                                   qr_data, issue_ts, expiry_ts, use_ts, ?
+                            FROM tickets WHERE rowid IN ({placeholders})
+                    ''', [int(time.time())] + rowids)
+                    conn.execute(f'DELETE FROM tickets WHERE rowid IN ({placeholders})', rowids)
+                archived += len(rowids)
+                chunks += 1
+                if pause:
+                    time.sleep(pause)
+        return archived
+    
+    def start_expiry_sweeper(self, interval=300, **sweep_options):
+        """Run sweep_expired every interval seconds on a daemon thread"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep_expired(**sweep_options)
+                except Exception as e:
+                    print(f"Expiry sweep failed: {e}")
+        
+        thread = threading.Thread(target=loop, name="expiry-sweeper", daemon=True)
+        thread.start()
+        return thread
+
+# Batch workers for issuance and bulk validation (run in separate processes)
+_batch_system = None
+
+def _init_batch_worker(key_state):
+    """Load key material once per worker process"""
+    global _batch_system
+    system = SecureTicketingSystem.__new__(SecureTicketingSystem)
+    system.backend = default_backend()
+    system.payload_format = key_state["payload_format"]
+    system.compress = key_state["compress"]
+    system.embedded_keys = key_state["embedded_keys"]
+    system.signature_scheme = key_state["signature_scheme"]
+    system.verify_cache = None
+    system.metrics = PipelineMetrics(enabled=False)
+    system.keyring = Keyring(**key_state["keyring_options"])
+    system.signers = {}
+    for scheme, public_pem in key_state["public_pems"]:
+        signer = SIGNERS[scheme](public_key=serialization.load_pem_public_key(public_pem))
+        system.signers[signer.key_id] = signer
+    private_key = serialization.load_pem_private_key(
+        key_state["private_pem"], password=None, backend=system.backend
+    )
+    system.use_signer(SIGNERS[system.signature_scheme](private_key))
+    _batch_system = system
+
+def _seal_ticket_worker(args):
+    ticket_data, render, dek_id = args
+    qr_data = _batch_system.seal_ticket(ticket_data, dek_id)
+    qr_filename = _batch_system.render_qr(qr_data, ticket_data["ticket_id"]) if render else None
+    return qr_data, qr_filename
+
+def _open_ticket_worker(qr_data):
+    return _batch_system.open_ticket(qr_data)
 
 # Flask Web Application
-app = Flask(__name__)
-ticketing_system = SecureTicketingSystem()
+bp = Blueprint("ticketing", __name__)
+
+def create_app(config=None):
+    """Build the Flask app and its SecureTicketingSystem.
+    
+    Each call (i.e. each server worker) gets its own system with its own
+    per-thread DB connections; key material is loaded from the shared
+    key files. Settings come from TICKET_* environment variables unless
+    overridden by config.
+    """
+    app = Flask(__name__)
+    app.config.update(
+        TICKET_DB_PATH=os.environ.get("TICKET_DB_PATH", "tickets.db"),
+        TICKET_SIGNATURE_SCHEME=os.environ.get("TICKET_SIGNATURE_SCHEME", "rsa-pss"),
+        TICKET_QR_MODE=os.environ.get("TICKET_QR_MODE", "file"),
+        TICKET_KEYRING_DIR=os.environ.get("TICKET_KEYRING_DIR", "ticket_keys"),
+        TICKET_KEYRING_MODE=os.environ.get("TICKET_KEYRING_MODE", "rotating"),
+        TICKET_REDEMPTION_LOG=os.environ.get("TICKET_REDEMPTION_LOG"),
+        TICKET_DB_SHARDS=int(os.environ.get("TICKET_DB_SHARDS", 1)),
+        TICKET_SHARD_BY=os.environ.get("TICKET_SHARD_BY", "event"),
+        TICKET_MAX_WORKERS=int(os.environ.get("TICKET_MAX_WORKERS", 0)) or None,
+        TICKET_GATE_KEYS=os.environ.get("TICKET_GATE_KEYS"),
+        TICKET_ADMIN_TOKEN=os.environ.get("TICKET_ADMIN_TOKEN"),
+        # Set to 0 once every ticket issued with an embedded AES key has expired
+        TICKET_ACCEPT_EMBEDDED_KEYS=os.environ.get("TICKET_ACCEPT_EMBEDDED_KEYS", "1").lower()
+                                    not in ("0", "false", "no")
+    )
+    app.config.update(config or {})
+    app.extensions["ticketing_system"] = SecureTicketingSystem(
+        db_path=app.config["TICKET_DB_PATH"],
+        signature_scheme=app.config["TICKET_SIGNATURE_SCHEME"],
+        qr_mode=app.config["TICKET_QR_MODE"],
+        keyring_options={"key_dir": app.config["TICKET_KEYRING_DIR"],
+                         "mode": app.config["TICKET_KEYRING_MODE"]},
+        redemption_log_options=({"path": app.config["TICKET_REDEMPTION_LOG"]}
+                                if app.config["TICKET_REDEMPTION_LOG"] else None),
+        shards=app.config["TICKET_DB_SHARDS"],
+        shard_by=app.config["TICKET_SHARD_BY"],
+        max_workers=app.config["TICKET_MAX_WORKERS"],
+        gate_keys=(load_gate_keys(app.config["TICKET_GATE_KEYS"])
+                   if app.config["TICKET_GATE_KEYS"] else None),
+        embedded_keys=app.config["TICKET_ACCEPT_EMBEDDED_KEYS"]
+    )
+    app.register_blueprint(bp)
+    
+    sweep_interval = int(app.config.get("TICKET_SWEEP_INTERVAL") or os.environ.get("TICKET_SWEEP_INTERVAL", 0))
+    if sweep_interval:
+        app.extensions["ticketing_system"].start_expiry_sweeper(sweep_interval)
+    return app
+
+def get_ticketing_system():
+    return current_app.extensions["ticketing_system"]
+
+_default_app = None
 
-@app.route('/')
+def __getattr__(name):
+    """Build the default app on first use of Main.app / Main.ticketing_system.
+    
+    Keeps importing Main free of side effects (DB and key files), which
+    matters for pool workers and app-factory servers.
+    """
+    global _default_app
+    if name in ("app", "ticketing_system"):
+        if _default_app is None:
+            _default_app = create_app()
+        if name == "app":
+            return _default_app
+        return _default_app.extensions["ticketing_system"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@bp.route('/')
 def index():
     return render_template_string('''
     <!DOCTYPE html>
@@ -336,7 +2042,7 @@ def index():
             <h2>Validate Ticket</h2>
             <form id="validateForm">
                 <div class="form-group">
-                    <label>QR Code Data (paste JSON):</label>
+                    <label>QR Code Data (paste scanned text):</label>
                     <textarea id="qrData" rows="5" style="width: 100%; font-family: monospace;"></textarea>
                 </div>
                 <button type="submit">Validate Ticket</button>
@@ -366,7 +2072,8 @@ def index():
                             <div class="result success">
                                 <h3>Ticket Created Successfully!</h3>
                                 <p><strong>Ticket ID:</strong> ${result.ticket_id}</p>
-                                <p><strong>QR Code saved as:</strong> ${result.qr_filename}</p>
+                                ${result.qr_filename ? `<p><strong>QR Code saved as:</strong> ${result.qr_filename}</p>` : ''}
+                                <p><img src="${result.qr_url}&size=6" alt="Ticket QR code"></p>
                                 <p><strong>Event:</strong> ${result.ticket_data.event_name}</p>
                                 <p><strong>Holder:</strong> ${result.ticket_data.holder_name}</p>
                                 <p><strong>Seat:</strong> ${result.ticket_data.seat_number}</p>
@@ -421,7 +2128,7 @@ def index():
     </html>
     ''')
 
-@app.route('/create_ticket', methods=['POST'])
+@bp.route('/create_ticket', methods=['POST'])
 def create_ticket():
     try:
         event_name = request.form['event_name']
@@ -429,29 +2136,178 @@ def create_ticket():
         seat_number = request.form['seat_number']
         valid_hours = int(request.form['valid_hours'])
         
-        result = ticketing_system.create_ticket(event_name, holder_name, seat_number, valid_hours)
+        result = get_ticketing_system().create_ticket(event_name, holder_name, seat_number, valid_hours)
         return jsonify({"success": True, **result})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
-@app.route('/validate_ticket', methods=['POST'])
+@bp.route('/create_tickets_batch', methods=['POST'])
+def create_tickets_batch():
+    try:
+        data = request.json
+        result = get_ticketing_system().create_tickets_batch(
+            data['event_name'],
+            data['holders'],
+            int(data.get('valid_hours', 24)),
+            workers=data.get('workers'),
+            render=data.get('render')
+        )
+        return jsonify({"success": True, **result})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@bp.route('/tickets/<ticket_id>/qr.<image_format>', methods=['GET'])
+def ticket_qr(ticket_id, image_format):
+    if image_format not in QR_IMAGE_FORMATS:
+        return jsonify({"error": f"Unsupported image format: {image_format}"}), 400
+    system = get_ticketing_system()
+    # The image is the ticket itself: only the token from issuance unlocks it
+    if not system.check_qr_token(ticket_id, request.args.get('token')):
+        return jsonify({"error": "Ticket not found"}), 404
+    box_size = min(max(request.args.get('size', 10, type=int), 1), 40)
+    border = min(max(request.args.get('border', 5, type=int), 0), 10)
+    data = system.render_qr_bytes(ticket_id, box_size, border, image_format)
+    if data is None:
+        return jsonify({"error": "Ticket not found"}), 404
+    return Response(data, mimetype=QR_IMAGE_FORMATS[image_format],
+                    headers={'Cache-Control': 'private, max-age=3600'})
+
+@bp.route('/validate_ticket', methods=['POST'])
 def validate_ticket():
     try:
         qr_data = request.json['qr_data']
-        result = ticketing_system.validate_ticket(qr_data)
+        result = get_ticketing_system().validate_ticket(qr_data, request.json.get('gate'))
         return jsonify(result)
     except Exception as e:
         return jsonify({"valid": False, "reason": str(e)})
 
+@bp.route('/validate_tickets_stream', methods=['POST'])
+def validate_tickets_stream():
+    # Both are clamped server-side (max_workers, MAX_STREAM_BATCH)
+    workers = request.args.get('workers', type=int)
+    batch_size = request.args.get('batch_size', 200, type=int)
+    # redeem=0 only checks the tickets (nothing is marked used)
+    redeem = request.args.get('redeem', '1').lower() not in ('0', 'false', 'no')
+    system = get_ticketing_system()
+    
+    def generate():
+        for result in system.validate_tickets_stream(request.stream, workers, batch_size,
+                                                     redeem=redeem):
+            yield json.dumps(result) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bp.route('/events/<event_name>/stats', methods=['GET'])
+def event_stats(event_name):
+    stats = get_ticketing_system().event_stats(event_name)
+    if stats is None:
+        return jsonify({"error": "Event not found"}), 404
+    return jsonify(stats)
+
+def admin_denied():
+    """Error response unless the request carries "Authorization: Bearer <TICKET_ADMIN_TOKEN>".
+    
+    Without a configured token the admin routes are disabled; the expiry
+    sweep can still run in-process (TICKET_SWEEP_INTERVAL).
+    """
+    token = current_app.config.get("TICKET_ADMIN_TOKEN")
+    if not token:
+        return jsonify({"success": False, "error": "Admin API disabled"}), 403
+    scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(supplied.encode(), token.encode()):
+        return jsonify({"success": False, "error": "Admin token required"}), 401
+    return None
+
+@bp.route('/admin/sweep_expired', methods=['POST'])
+def sweep_expired():
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        archived = get_ticketing_system().sweep_expired(
+            grace_seconds=int(data.get('grace_seconds', 7 * 24 * 3600)),
+            chunk_size=int(data.get('chunk_size', 5000)),
+            max_chunks=data.get('max_chunks')
+        )
+        return jsonify({"success": True, "archived": archived})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@bp.route('/admin/rotate_key', methods=['POST'])
+def rotate_key():
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        keyring = get_ticketing_system().keyring
+        key_id, _ = keyring.rotate(data.get('event_name'))
+        return jsonify({"success": True, "key_id": key_id.hex(), **keyring.stats()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    system = get_ticketing_system()
+    gauges = {}
+    for name, cache in (("verify_cache", system.verify_cache),
+                        ("render_cache", system.render_cache)):
+        if cache is not None:
+            stats = cache.stats()
+            for key in ("entries", "bytes", "hits", "misses", "evictions"):
+                gauges[f"ticket_{name}_{key}"] = stats[key]
+    gauges["ticket_db_connections"] = sum(db.open_connections() for db in system.shards.databases)
+    if system.redemption_log is not None:
+        stats = system.redemption_log.stats()
+        gauges["ticket_redemption_log_records"] = stats["records"]
+        gauges["ticket_redemption_log_commits"] = stats["commits"]
+    return Response(system.metrics.render(gauges),
+                    mimetype='text/plain; version=0.0.4')
+
+@bp.route('/verify_cache/stats', methods=['GET'])
+def verify_cache_stats():
+    cache = get_ticketing_system().verify_cache
+    return jsonify(cache.stats() if cache else {"enabled": False})
+
+def authenticated_gate(system):
+    """Gate that signed this request (see redemption_index.gate_auth_headers), or None"""
+    return verify_gate_request(system.gate_keys, request.headers, request.method,
+                               request.path, request.query_string.decode())
+
+@bp.route('/redemption_index', methods=['GET'])
+def redemption_index():
+    system = get_ticketing_system()
+    if authenticated_gate(system) is None:
+        return jsonify({"error": "Gate credentials required"}), 401
+    data = system.export_redemption_index(request.args.get('event'))
+    return Response(data, mimetype='application/octet-stream',
+                    headers={'Content-Disposition': 'attachment; filename=redemption_index.bin'})
+
+@bp.route('/sync_redemptions', methods=['POST'])
+def sync_redemptions():
+    try:
+        system = get_ticketing_system()
+        gate = authenticated_gate(system)
+        if gate is None:
+            return jsonify({"success": False, "error": "Gate credentials required"}), 401
+        result = system.sync_redemptions(request.json['redemptions'], gate)
+        return jsonify({"success": True, **result})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
 if __name__ == '__main__':
+    app = create_app()
+    ticketing_system = app.extensions["ticketing_system"]
     print("🎫 Secure QR Ticketing System Starting...")
     print("📋 Features:")
     print("   ✅ AES-256-GCM Encryption")
-    print("   ✅ RSA-PSS Digital Signatures") 
+    print(f"   ✅ {ticketing_system.signature_scheme.upper()} Digital Signatures")
     print("   ✅ Single-use Validation")
     print("   ✅ Tamper Detection")
     print("   ✅ Expiry Management")
     print("\n🌐 Web interface: http://localhost:5000")
     print("📁 QR codes saved in current directory")
-    print("🗃️ Database: tickets.db")
+    print(f"🗃️ Database: {ticketing_system.db_path}")
+    print("🚀 Production: python serve.py --help")
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,134 @@
+# ASGI entry point for the ticketing service
+# Run: python serve.py --server uvicorn   (or: uvicorn asgi:app --workers 4)
+#
+# The Flask app is WSGI, so the adapter below runs every request - and with
+# it all the CPU-bound AES/RSA work - on a thread pool. The event loop only
+# shuffles bytes and is never blocked by crypto.
+
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _ReceiveStream(io.RawIOBase):
+    """Blocking file-like view of the ASGI receive channel for wsgi.input.
+
+    Read from a worker thread; each read hops back onto the event loop to
+    pull the next body chunk, so large uploads are never fully buffered.
+    """
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.pending = b""
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending and not self.finished:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message["type"] == "http.disconnect":
+                self.finished = True
+                break
+            self.pending = message.get("body", b"")
+            self.finished = not message.get("more_body", False)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+class ThreadPoolWSGIAdapter:
+    """Serve a WSGI app from an ASGI server, running it on a thread pool"""
+
+    def __init__(self, wsgi_app, max_workers=16):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    self.executor.shutdown(wait=False)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        loop = asyncio.get_running_loop()
+        environ = self.build_environ(scope, io.BufferedReader(_ReceiveStream(receive, loop)))
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1"))
+                                   for k, v in headers]
+
+        # Every hop onto the pool runs in the same context, so Flask's
+        # request context survives across chunks of a streamed response
+        context = contextvars.copy_context()
+        iterable = await loop.run_in_executor(self.executor, context.run,
+                                              self.wsgi_app, environ, start_response)
+        try:
+            await send({"type": "http.response.start",
+                        "status": response["status"], "headers": response["headers"]})
+            chunks = iter(iterable)
+            while True:
+                chunk = await loop.run_in_executor(self.executor, context.run, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(iterable, "close"):
+                await loop.run_in_executor(self.executor, context.run, iterable.close)
+
+    @staticmethod
+    def build_environ(scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "REMOTE_ADDR": client[0],
+            "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.input_terminated": True,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[name] = value
+            else:
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+def create_asgi_app(max_workers=None):
+    from Main import create_app
+    max_workers = max_workers or int(os.environ.get("TICKET_THREADS", "16"))
+    return ThreadPoolWSGIAdapter(create_app(), max_workers=max_workers)
+
+
+app = create_asgi_app()
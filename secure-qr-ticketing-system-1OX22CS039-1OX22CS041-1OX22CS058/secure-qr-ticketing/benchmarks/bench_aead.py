@@ -0,0 +1,64 @@
+"""AES-256-GCM throughput: Cipher/encryptor objects per call vs one-shot AESGCM.
+
+The streaming path is how encrypt_data/decrypt_data worked before the
+one-shot AEAD API (str in, separate tag out). Sizes cover a ticket payload
+(~200 bytes) up to bulk buffers.
+
+Usage: python benchmarks/bench_aead.py [seconds per case]
+"""
+
+import os
+import sys
+import time
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from common import load_main
+
+SIZES = [64, 256, 1024, 16 * 1024, 256 * 1024]
+
+
+def streaming_roundtrip(data, key, iv, backend):
+    encryptor = Cipher(algorithms.AES(key), modes.GCM(iv), backend=backend).encryptor()
+    ciphertext = encryptor.update(data.encode()) + encryptor.finalize()
+    decryptor = Cipher(algorithms.AES(key), modes.GCM(iv, encryptor.tag), backend=backend).decryptor()
+    return (decryptor.update(ciphertext) + decryptor.finalize()).decode()
+
+
+def aead_roundtrip(system, data, key, iv, aad):
+    return system.decrypt_data(system.encrypt_data(data, key, iv, aad), key, iv, aad)
+
+
+def ops_per_second(func, seconds):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        func()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    Main, _ = load_main()
+    system = Main.SecureTicketingSystem(qr_mode="lazy", metrics_enabled=False)
+    backend = default_backend()
+    key, iv = system.generate_aes_key()
+    aad = b"\x03\x01" + system.signer.key_id
+
+    print(f"{'bytes':>8}{'streaming ops/s':>17}{'MB/s':>9}{'one-shot ops/s':>16}{'MB/s':>9}{'speedup':>9}")
+    for size in SIZES:
+        text = os.urandom(size // 2).hex()
+        data = text.encode()
+        assert streaming_roundtrip(text, key, iv, backend) == text
+        assert aead_roundtrip(system, data, key, iv, aad) == data
+
+        old = ops_per_second(lambda: streaming_roundtrip(text, key, iv, backend), seconds)
+        new = ops_per_second(lambda: aead_roundtrip(system, data, key, iv, aad), seconds)
+        print(f"{size:>8}{old:>17,.0f}{old * size / 1e6:>9.1f}"
+              f"{new:>16,.0f}{new * size / 1e6:>9.1f}{new / old:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
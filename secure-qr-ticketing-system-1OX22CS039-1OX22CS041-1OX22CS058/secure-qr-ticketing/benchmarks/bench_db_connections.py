@@ -0,0 +1,80 @@
+"""Validations/sec with per-call connections vs the pooled WAL connection layer.
+
+Usage: python benchmarks/bench_db_connections.py [tickets]
+"""
+
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from common import load_main, holders
+
+
+def legacy_redeem(db_path, ticket_id):
+    """DB half of validate_ticket as it was before TicketDatabase"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM tickets WHERE ticket_id = ?', (ticket_id,))
+    row = cursor.fetchone()
+    if row and not row[5]:
+        cursor.execute('UPDATE tickets SET used = 1, use_time = ? WHERE ticket_id = ?',
+                       (datetime.now().isoformat(), ticket_id))
+        conn.commit()
+    conn.close()
+
+
+def pooled_redeem(db, ticket_id):
+    conn = db.connection()
+    with conn:
+        row = conn.execute('SELECT * FROM tickets WHERE ticket_id = ?', (ticket_id,)).fetchone()
+        if row and not row[5]:
+            conn.execute('UPDATE tickets SET used = 1, use_time = ? WHERE ticket_id = ?',
+                         (datetime.now().isoformat(), ticket_id))
+
+
+def issue(system, count):
+    batch = system.create_tickets_batch("Bench", holders(count), render=False)
+    return batch["tickets"]
+
+
+def rate(count, start):
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    Main, _ = load_main()
+
+    # Before: rollback journal, synchronous=FULL, connect/close per scan
+    legacy = Main.SecureTicketingSystem("legacy.db", {"journal_mode": "DELETE", "synchronous": "FULL"})
+    tickets = issue(legacy, count)
+    legacy.db.close_all()
+    start = time.perf_counter()
+    for t in tickets:
+        legacy_redeem("legacy.db", t["ticket_id"])
+    before = rate(count, start)
+
+    # After: one pooled connection per thread in WAL mode
+    pooled = Main.SecureTicketingSystem("pooled.db")
+    tickets = issue(pooled, count)
+    start = time.perf_counter()
+    for t in tickets:
+        pooled_redeem(pooled.db, t["ticket_id"])
+    after = rate(count, start)
+
+    # End to end validate_ticket (crypto + DB) on the pooled layer
+    tickets = issue(pooled, count)
+    start = time.perf_counter()
+    for t in tickets:
+        pooled.validate_ticket(t["qr_data"])
+    end_to_end = rate(count, start)
+
+    print(f"tickets: {count}")
+    print(f"DB redeem, per-call connect + rollback journal: {before:10.1f} /s")
+    print(f"DB redeem, pooled WAL connection:              {after:10.1f} /s  ({after / before:.1f}x)")
+    print(f"validate_ticket end to end (pooled):           {end_to_end:10.1f} /s")
+
+
+if __name__ == "__main__":
+    main()
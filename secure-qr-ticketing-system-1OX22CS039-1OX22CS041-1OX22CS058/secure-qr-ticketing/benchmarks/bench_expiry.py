@@ -0,0 +1,65 @@
+"""Expiry check cost: strptime on every scan vs the signed epoch and the cached ISO path.
+
+The first table times the expiry check alone. The second runs
+validate_ticket end to end with a warm verified-ticket cache (so crypto
+is out of the picture) on expired tickets, which are rejected by the
+expiry check before any database work.
+
+Usage: python benchmarks/bench_expiry.py [iterations]
+"""
+
+import sys
+import time
+from datetime import datetime
+
+from common import load_main
+
+
+def strptime_check(ticket_data):
+    """The check as validate_ticket did it before expiry_ts existed"""
+    datetime_str = ticket_data["expiry_time"]
+    try:
+        expiry_time = datetime.strptime(datetime_str[:19], '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        expiry_time = datetime.strptime(datetime_str[:26], '%Y-%m-%dT%H:%M:%S.%f')
+    return datetime.now() > expiry_time
+
+
+def rate(func, arg, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    Main, _ = load_main()
+    system = Main.SecureTicketingSystem(qr_mode="lazy", metrics_enabled=False)
+
+    ticket = system.build_ticket_data("Bench", "Holder", "S-1", valid_hours=-1)
+    legacy = dict(ticket)
+    del legacy["expiry_ts"]
+    now = time.time()
+
+    print(f"{'expiry check':<24}{'checks/s':>14}")
+    for name, func, arg in [
+        ("strptime (old)", strptime_check, legacy),
+        ("legacy ISO, cached", lambda t: Main.ticket_expiry_ts(t) <= now, legacy),
+        ("signed expiry_ts", lambda t: Main.ticket_expiry_ts(t) <= now, ticket),
+    ]:
+        print(f"{name:<24}{rate(func, arg, iterations):>14,.0f}")
+
+    # End to end: the QR strings differ only in whether expiry_ts is signed in
+    qr_new = system.seal_ticket(ticket)
+    qr_legacy = system.seal_ticket(legacy)
+    count = iterations // 10
+    print(f"\n{'validate_ticket':<24}{'scans/s':>14}")
+    for name, qr_data in [("legacy ticket", qr_legacy), ("epoch ticket", qr_new)]:
+        result = system.validate_ticket(qr_data)
+        assert result["reason"] == "Ticket expired", result
+        print(f"{name:<24}{rate(system.validate_ticket, qr_data, count):>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
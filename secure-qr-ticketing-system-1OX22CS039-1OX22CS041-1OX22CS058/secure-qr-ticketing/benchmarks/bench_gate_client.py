@@ -0,0 +1,81 @@
+"""Gate mode validation: one-off requests.post per scan vs the pooled GateValidator.
+
+Starts a local stand-in server (the real app on a scratch directory) unless
+--url is given. Every ticket is "seen" on --repeats consecutive frames, as
+a camera would, to exercise de-duplication.
+
+Usage: python benchmarks/bench_gate_client.py [--url http://host:5000] [--tickets 300] [--repeats 5]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from common import load_main, holders
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def report(name, tickets, elapsed, latencies):
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"{name:<16}{len(latencies):>6} requests  {tickets / elapsed:>8.1f} tickets/s  "
+          f"p50 {cuts[49]:>6.2f} ms  p99 {cuts[98]:>6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url")
+    parser.add_argument("--tickets", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    Main, _ = load_main()
+    from gate_client import GateValidator
+
+    system = Main.SecureTicketingSystem(qr_mode="lazy", metrics_enabled=False)
+    url = args.url
+    if url is None:
+        app = Main.create_app({"TICKET_QR_MODE": "lazy"})
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+
+    def issue():
+        batch = system.create_tickets_batch("Gate Bench", holders(args.tickets), render=False)
+        return [t["qr_data"] for t in batch["tickets"]]
+
+    # Baseline: a fresh connection per scan, duplicates sent too
+    codes = issue()
+    latencies = []
+    start = time.perf_counter()
+    for qr_data in codes:
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            requests.post(url + "/validate_ticket", json={"qr_data": qr_data}, timeout=10).json()
+            latencies.append((time.perf_counter() - t0) * 1000)
+    report("requests.post", len(codes), time.perf_counter() - start, latencies)
+
+    # Gate mode: de-duplicated, pooled keep-alive session, background workers
+    codes = issue()
+    gate = GateValidator(url)
+    start = time.perf_counter()
+    for qr_data in codes:
+        for _ in range(args.repeats):
+            gate.submit(qr_data)
+    results = [gate.results.get() for _ in codes]
+    elapsed = time.perf_counter() - start
+    gate.close()
+    report("GateValidator", len(codes), elapsed, [r["latency_ms"] for r in results])
+    accepted = sum(1 for r in results if r["valid"])
+    print(f"{accepted}/{len(results)} accepted, {gate.duplicates} repeat reads suppressed")
+
+
+if __name__ == "__main__":
+    main()
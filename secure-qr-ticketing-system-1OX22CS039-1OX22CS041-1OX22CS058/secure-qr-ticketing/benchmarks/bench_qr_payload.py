@@ -0,0 +1,82 @@
+"""QR version, render/decode time and parse time: legacy JSON vs binary payloads.
+
+"parse us" is parse_payload alone (base64 + JSON vs base45 + struct), the
+first step of every validation.
+
+Decoding uses pyzbar (as the desktop app does) when the zbar library is
+available, otherwise OpenCV's QRCodeDetector.
+
+Usage: python benchmarks/bench_qr_payload.py [rounds]
+"""
+
+import io
+import sys
+import time
+
+import qrcode
+from PIL import Image
+
+from common import load_main, holders
+
+try:
+    from pyzbar import pyzbar
+except ImportError:
+    pyzbar = None
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+
+def render(qr_data):
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    buf = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buf)
+    return qr.version, buf.getvalue()
+
+
+def make_decoder():
+    if pyzbar is not None:
+        return "pyzbar", lambda img: pyzbar.decode(img)[0].data.decode()
+    if cv2 is not None:
+        detector = cv2.QRCodeDetector()
+        return "opencv", lambda img: detector.detectAndDecode(np.array(img))[0]
+    return None, None
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return (time.perf_counter() - start) / rounds * 1000, result
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    Main, _ = load_main()
+    decoder_name, decode = make_decoder()
+
+    print(f"{'format':<8}{'chars':>7}{'QR ver':>8}{'render ms':>11}{'decode ms':>11}{'parse us':>10}")
+    for fmt in ("json", "binary"):
+        system = Main.SecureTicketingSystem(f"{fmt}.db", payload_format=fmt)
+        batch = system.create_tickets_batch("Bench Concert 2025", holders(1), workers=1, render=False)
+        qr_data = batch["tickets"][0]["qr_data"]
+        render_ms, (version, png) = timed(lambda: render(qr_data), rounds)
+
+        decode_ms = "n/a"
+        if decode is not None:
+            image = Image.open(io.BytesIO(png)).convert("L")
+            decode_ms, decoded = timed(lambda: decode(image), rounds)
+            decode_ms = f"{decode_ms:.2f}" if decoded == qr_data else "failed"
+        parse_ms, _ = timed(lambda: system.parse_payload(qr_data), rounds * 500)
+        assert system.validate_ticket(qr_data)["valid"]
+        print(f"{fmt:<8}{len(qr_data):>7}{version:>8}{render_ms:>11.2f}{decode_ms:>11}{parse_ms * 1000:>10.1f}")
+    print(f"decoder: {decoder_name or 'none installed'}")
+
+
+if __name__ == "__main__":
+    main()
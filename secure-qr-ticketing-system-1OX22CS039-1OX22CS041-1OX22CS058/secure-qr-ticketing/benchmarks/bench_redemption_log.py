@@ -0,0 +1,98 @@
+"""Redemption log throughput at rising concurrency: fsync per record vs group commit.
+
+The first table appends records from N threads straight to RedemptionLog:
+"per-record" allows one record per fsync (what a plain append + fsync per
+scan costs), "group" (the default) batches whatever queued up while the
+previous fsync ran, and "group +2ms" also waits up to 2 ms for more scans
+to join when several are arriving at once. The
+second table runs validate_ticket end to end from N threads with and
+without the log.
+
+Usage: python benchmarks/bench_redemption_log.py [records per run] [max threads]
+"""
+
+import statistics
+import sys
+import threading
+import time
+
+from common import holders, load_main
+
+VARIANTS = {
+    "per-record": {"commit_window": 0.0, "max_batch": 1},
+    "group": {"commit_window": 0.0},
+    "group +2ms": {"commit_window": 0.002},
+}
+
+
+def concurrency_levels(max_threads):
+    level = 1
+    while level <= max_threads:
+        yield level
+        level *= 2
+
+
+def run_threads(threads, items, func):
+    """Call func(item) for every item from `threads` threads; returns (seconds, latencies)"""
+    chunks = [items[i::threads] for i in range(threads)]
+    latencies = [[] for _ in range(threads)]
+
+    def worker(n):
+        for item in chunks[n]:
+            start = time.perf_counter()
+            func(item)
+            latencies[n].append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - start, [x for chunk in latencies for x in chunk]
+
+
+def p99(latencies):
+    return statistics.quantiles(latencies, n=100)[98] * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    Main, _ = load_main()
+    from redemption_log import RedemptionLog, verify
+
+    print(f"{'variant':<12}{'threads':>8}{'appends/s':>11}{'mean ms':>9}{'p99 ms':>8}{'per fsync':>11}")
+    for name, options in VARIANTS.items():
+        for threads in concurrency_levels(max_threads):
+            path = f"bench-{name.replace(' ', '-')}-{threads}.log"
+            log = RedemptionLog(path, **options)
+            elapsed, latencies = run_threads(
+                threads, [f"ticket-{i}" for i in range(count)],
+                lambda ticket_id: log.append(ticket_id, "valid", gate=threading.current_thread().name))
+            log.close()
+            assert verify(path)["records"] == count
+            print(f"{name:<12}{threads:>8}{count / elapsed:>11,.0f}"
+                  f"{statistics.mean(latencies) * 1000:>9.2f}{p99(latencies):>8.2f}"
+                  f"{log.stats()['records_per_commit']:>11.1f}")
+
+    # End to end: the same scans with and without the log
+    validations = max(count // 4, 100)
+    print(f"\nvalidate_ticket, {validations} fresh tickets per run")
+    print(f"{'log':<12}{'threads':>8}{'scans/s':>11}{'mean ms':>9}{'p99 ms':>8}")
+    system = Main.SecureTicketingSystem(qr_mode="lazy", metrics_enabled=False, signature_scheme="ed25519")
+    for label, options in (("off", None), ("group", {"path": "bench-validate.log"})):
+        system.redemption_log = RedemptionLog(**options) if options else None
+        for threads in concurrency_levels(min(max_threads, 16)):
+            tickets = system.create_tickets_batch(f"Bench {label} {threads}", holders(validations),
+                                                  render=False)["tickets"]
+            codes = [t["qr_data"] for t in tickets]
+            elapsed, latencies = run_threads(threads, codes, lambda qr: system.validate_ticket(qr, "bench"))
+            print(f"{label:<12}{threads:>8}{validations / elapsed:>11,.0f}"
+                  f"{statistics.mean(latencies) * 1000:>9.2f}{p99(latencies):>8.2f}")
+        if system.redemption_log is not None:
+            system.redemption_log.close()
+
+
+if __name__ == "__main__":
+    main()
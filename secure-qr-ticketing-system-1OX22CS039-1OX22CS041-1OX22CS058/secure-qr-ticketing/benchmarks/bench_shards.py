@@ -0,0 +1,110 @@
+"""Issuance and validation for several events at once: one tickets.db vs shards.
+
+One thread runs a big sale (create_tickets_batch in a loop) while one
+validator thread per other event redeems that event's pre-issued tickets.
+With a single database every redemption queues behind the sale's write
+transactions; sharded by event, events that hash to other shards never
+wait for it. Sharded by ticket, each write is split across every shard.
+Reports tickets issued/s, scans/s and the validators' mean and p99
+latency, plus scans/s relative to the single file. events may be a
+comma-separated list (e.g. 1,2,4,8) to find where sharding starts to pay.
+
+Usage: python benchmarks/bench_shards.py [events] [tickets per event] [shards] [--full]
+
+--full runs SQLite with synchronous=FULL (an fsync per commit), which
+makes each write transaction, and so the contention, much longer.
+
+Measured on one CPU, 300 scans per event, 4 shards (sweep 1,2,4,8):
+with synchronous=NORMAL no layout reliably beats the single file (0.7x to
+1.2x scans/s, within run-to-run noise). With --full, by-event sharding
+starts to pay at about 4 events scanning during the sale: 1.2x to 1.7x
+scans/s and a p99 of 8-25 ms instead of 56-232 ms. With 1 or 2 events
+it swung between 0.8x and 1.8x from run to run. Issuance during the sale
+drops by up to 40% once shards are in play. Hence sharding is opt-in.
+"""
+
+import statistics
+import sys
+import threading
+import time
+
+from common import holders, load_main
+
+SALE_BATCH = 500
+
+
+def run(Main, layout, shards, shard_by, events, per_event, db_options):
+    system = Main.SecureTicketingSystem(f"{layout}.db", db_options, qr_mode="lazy",
+                                        metrics_enabled=False, signature_scheme="ed25519",
+                                        shards=shards, shard_by=shard_by)
+    codes = {}
+    for n in range(events):
+        batch = system.create_tickets_batch(f"Event {n}", holders(per_event), render=False)
+        codes[n] = [t["qr_data"] for t in batch["tickets"]]
+
+    stop = threading.Event()
+    issued = [0]
+    latencies = [[] for _ in range(events)]
+
+    def sale():
+        while not stop.is_set():
+            batch = system.create_tickets_batch("Big sale", holders(SALE_BATCH), render=False)
+            issued[0] += len(batch["tickets"])
+
+    def validator(n):
+        for qr_data in codes[n]:
+            start = time.perf_counter()
+            result = system.validate_ticket(qr_data, f"gate-{n}")
+            latencies[n].append(time.perf_counter() - start)
+            assert result["valid"], result
+
+    seller = threading.Thread(target=sale)
+    validators = [threading.Thread(target=validator, args=(n,)) for n in range(events)]
+    start = time.perf_counter()
+    seller.start()
+    for thread in validators:
+        thread.start()
+    for thread in validators:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    seller.join()
+    system.shards.close_all()
+
+    scans = [x for chunk in latencies for x in chunk]
+    return {
+        "issued/s": issued[0] / elapsed,
+        "scans/s": len(scans) / elapsed,
+        "mean ms": statistics.mean(scans) * 1000,
+        "p99 ms": statistics.quantiles(scans, n=100)[98] * 1000,
+    }
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    event_counts = [int(n) for n in args[0].split(",")] if len(args) > 0 else [4]
+    per_event = int(args[1]) if len(args) > 1 else 500
+    shards = int(args[2]) if len(args) > 2 else 4
+    db_options = {"synchronous": "FULL"} if "--full" in sys.argv else None
+    Main, _ = load_main()
+
+    layouts = [("single", 1, "event"),
+               (f"{shards} by event", shards, "event"),
+               (f"{shards} by ticket", shards, "ticket")]
+    print(f"events x {per_event} scans alongside a big sale, "
+          f"synchronous={'FULL' if db_options else 'NORMAL'}")
+    print(f"{'events':>6}  {'layout':<16}{'issued/s':>10}{'scans/s':>10}{'mean ms':>9}{'p99 ms':>9}"
+          f"{'vs single':>11}")
+    for events in event_counts:
+        baseline = None
+        for name, count, shard_by in layouts:
+            result = run(Main, f"{events}-{name.replace(' ', '-')}", count, shard_by,
+                         events, per_event, db_options)
+            baseline = baseline or result["scans/s"]
+            print(f"{events:>6}  {name:<16}{result['issued/s']:>10,.0f}{result['scans/s']:>10,.0f}"
+                  f"{result['mean ms']:>9.2f}{result['p99 ms']:>9.2f}"
+                  f"{result['scans/s'] / baseline:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Sign/verify ops per second and payload size for each signature scheme.
+
+Usage: python benchmarks/bench_signers.py [seconds-per-measurement]
+"""
+
+import sys
+import time
+
+from common import load_main, holders
+
+
+def ops_per_second(fn, seconds):
+    fn()  # warm up
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    Main, _ = load_main()
+
+    print(f"{'scheme':<12}{'sign/s':>10}{'verify/s':>11}{'sig bytes':>11}{'QR chars':>10}")
+    for scheme in Main.SIGNERS:
+        system = Main.SecureTicketingSystem(f"{scheme}.db", signature_scheme=scheme)
+        ticket = system.create_tickets_batch("Bench", holders(1), workers=1, render=False)["tickets"][0]
+        data = '{"ticket_id": "00000000-0000-0000-0000-000000000000", "seat_number": "A-15"}'
+        signature = system.sign_data(data)
+        key_id = system.signer.key_id
+
+        sign_rate = ops_per_second(lambda: system.sign_data(data), seconds)
+        verify_rate = ops_per_second(lambda: system.verify_signature(data, signature, key_id), seconds)
+        assert system.validate_ticket(ticket["qr_data"])["valid"]
+        print(f"{scheme:<12}{sign_rate:>10.0f}{verify_rate:>11.0f}{len(signature):>11}{len(ticket['qr_data']):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Event report latency with and without indexes, and expiry sweeper throughput.
+
+Fills the tickets table with synthetic rows (no crypto, qr_data is a
+placeholder) spread over many events, then times event_stats against the
+same query forced to scan the table, and finally archives the expired
+share with sweep_expired.
+
+Usage: python benchmarks/bench_ticket_store.py [--rows 10000000] [--events 1000] [--chunk 5000]
+"""
+
+import argparse
+import time
+import uuid
+from datetime import datetime
+
+from common import load_main
+
+FILL_BATCH = 50000
+
+
+def fill(system, rows, events):
+    """Insert rows tickets; about a quarter are redeemed and a third long expired"""
+    now = int(time.time())
+    conn = system.db.connection()
+    with conn:
+        conn.executemany('INSERT OR IGNORE INTO events (event_name, created_ts) VALUES (?, ?)',
+                         [(f"Event {e}", now) for e in range(events)])
+    for start in range(0, rows, FILL_BATCH):
+        batch = []
+        for i in range(start, min(start + FILL_BATCH, rows)):
+            # Vary state within each event, not across events
+            n = i // events
+            expiry_ts = now - 30 * 86400 if n % 3 == 0 else now + 86400
+            used = n % 4 == 0
+            batch.append((str(uuid.UUID(int=i)), f"Event {i % events}",
+                          datetime.fromtimestamp(expiry_ts - 86400).isoformat(),
+                          datetime.fromtimestamp(expiry_ts).isoformat(),
+                          used, "-", expiry_ts - 86400, expiry_ts, now if used else None))
+        with conn:
+            conn.executemany('''
+                INSERT INTO tickets (ticket_id, event_name, issue_time, expiry_time, used,
+                                     qr_data, issue_ts, expiry_ts, use_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', batch)
+
+
+def scan_stats(conn, event_name):
+    """The event_stats counting query with the indexes disabled"""
+    return conn.execute('''
+        SELECT COUNT(*), COALESCE(SUM(used = 1), 0),
+               COALESCE(SUM(used = 0 AND expiry_ts <= ?), 0)
+        FROM tickets NOT INDEXED WHERE event_name = ?
+    ''', (int(time.time()), event_name)).fetchone()
+
+
+def timed(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--chunk", type=int, default=5000)
+    args = parser.parse_args()
+
+    Main, _ = load_main()
+    system = Main.SecureTicketingSystem(qr_mode="lazy", metrics_enabled=False)
+
+    start = time.perf_counter()
+    fill(system, args.rows, args.events)
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {args.rows} rows in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+    event_name = f"Event {args.events // 2}"
+    conn = system.db.connection()
+    indexed = timed(system.event_stats, event_name)
+    scanned = timed(scan_stats, conn, event_name, repeat=2)
+    print(f"event_stats  indexed {indexed * 1000:9.2f} ms   full scan {scanned * 1000:9.2f} ms   "
+          f"speedup {scanned / indexed:,.0f}x")
+    print(f"  {system.event_stats(event_name)}")
+
+    # Sweep one chunk at a time to record the worst-case lock hold
+    archived = 0
+    chunk_times = []
+    start = time.perf_counter()
+    while True:
+        chunk_start = time.perf_counter()
+        moved = system.sweep_expired(grace_seconds=7 * 86400, chunk_size=args.chunk, max_chunks=1)
+        if not moved:
+            break
+        chunk_times.append(time.perf_counter() - chunk_start)
+        archived += moved
+    elapsed = time.perf_counter() - start
+    print(f"Swept {archived} rows in {elapsed:.1f}s ({archived / elapsed:,.0f} rows/s), "
+          f"{len(chunk_times)} chunks, max chunk {max(chunk_times) * 1000:.1f} ms")
+
+    indexed = timed(system.event_stats, event_name)
+    print(f"event_stats after sweep {indexed * 1000:.2f} ms  {system.event_stats(event_name)}")
+
+
+if __name__ == "__main__":
+    main()
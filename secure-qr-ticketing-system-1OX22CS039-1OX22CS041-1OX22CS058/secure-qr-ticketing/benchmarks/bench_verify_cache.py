@@ -0,0 +1,62 @@
+"""Repeat-scan speedup of the verified-ticket cache, and its memory bound.
+
+Scans a set of already-used tickets repeatedly (as happens with re-entry
+attempts and replays) with and without the cache, then fills a small cache
+far past its max_bytes limit and checks tracemalloc against the estimate.
+
+Usage: python benchmarks/bench_verify_cache.py [tickets] [repeats]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from common import load_main, holders
+
+
+def scan_rate(system, codes, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for qr_data in codes:
+            system.validate_ticket(qr_data)
+    return len(codes) * repeats / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    Main, _ = load_main()
+
+    uncached = Main.SecureTicketingSystem("bench.db", verify_cache_options={"max_entries": 0})
+    cached = Main.SecureTicketingSystem("bench.db")
+    codes = [t["qr_data"] for t in
+             cached.create_tickets_batch("Bench", holders(count), render=False)["tickets"]]
+    for qr_data in codes:
+        uncached.validate_ticket(qr_data)  # redeem once, every later scan is a repeat
+
+    before = scan_rate(uncached, codes, repeats)
+    after = scan_rate(cached, codes, repeats)
+    print(f"repeat scans without cache: {before:10.1f} /s")
+    print(f"repeat scans with cache:    {after:10.1f} /s  ({after / before:.1f}x)")
+    print(f"cache stats: {cached.verify_cache.stats()}")
+
+    # Memory bound: push 10x more tickets than fit and compare with tracemalloc
+    limit = 256 * 1024
+    cache = Main.VerifiedTicketCache(max_entries=10**6, max_bytes=limit)
+    ticket_data = cached.build_ticket_data("Bench", "Holder", "S-1")
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(20000):
+        entry = dict(ticket_data, ticket_id=f"{i:036d}")
+        cache.put(i.to_bytes(32, "big"), (entry, None))
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    stats = cache.stats()
+    print(f"memory limit {limit} B: estimate {stats['bytes']} B, traced {used} B, "
+          f"{stats['entries']} entries, {stats['evictions']} evictions")
+    assert stats["bytes"] <= limit, "cache exceeded its byte budget"
+    assert used <= limit * 1.5, "cache memory estimate is too optimistic"
+
+
+if __name__ == "__main__":
+    main()
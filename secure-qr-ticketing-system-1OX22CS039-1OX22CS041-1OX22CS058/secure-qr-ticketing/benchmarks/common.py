@@ -0,0 +1,25 @@
+"""Shared setup for the ticketing benchmarks.
+
+Main.py creates tickets.db and the RSA key files in the working directory
+when it is imported, so every benchmark runs inside a scratch directory.
+"""
+
+import os
+import sys
+import tempfile
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_main():
+    """Import Main.py from inside a fresh temporary directory"""
+    workdir = tempfile.mkdtemp(prefix="ticket-bench-")
+    os.chdir(workdir)
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    import Main
+    return Main, workdir
+
+
+def holders(count):
+    return [{"holder_name": f"Holder {i}", "seat_number": f"S-{i}"} for i in range(count)]
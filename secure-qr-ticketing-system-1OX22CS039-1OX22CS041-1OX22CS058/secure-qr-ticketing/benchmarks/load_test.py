@@ -0,0 +1,102 @@
+"""HTTP load test: p50/p99 latency and throughput for create and validate.
+
+Point it at a running server (e.g. one started with serve.py), or leave
+--url out to start a threaded in-process server on a scratch directory.
+
+Usage: python benchmarks/load_test.py [--url http://host:5000] [--requests 500] [--concurrency 16]
+"""
+
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from common import load_main
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Client:
+    """One keep-alive connection per load-generating thread"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = None
+
+    def post(self, path, body, content_type):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        start = time.perf_counter()
+        self.conn.request("POST", path, body=body, headers={"Content-Type": content_type})
+        response = self.conn.getresponse()
+        data = json.loads(response.read())
+        return time.perf_counter() - start, data
+
+
+def run_phase(url, bodies, path, content_type, concurrency):
+    local = threading.local()
+
+    def send(body):
+        if not hasattr(local, "client"):
+            local.client = Client(url)
+        return local.client.post(path, body, content_type)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, bodies))
+    return time.perf_counter() - start, results
+
+
+def report(name, elapsed, results):
+    latencies = sorted(r[0] * 1000 for r in results)
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"{name:<9} {len(latencies):>6} req  {len(latencies) / elapsed:>8.1f} req/s  "
+          f"p50 {cuts[49]:>7.2f} ms  p99 {cuts[98]:>7.2f} ms  max {latencies[-1]:>7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        Main, _ = load_main()
+        app = Main.create_app({"TICKET_QR_MODE": "lazy"})
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+
+    creates = [urlencode({"event_name": "Load Test", "holder_name": f"Guest {i}",
+                          "seat_number": f"S-{i}", "valid_hours": 24})
+               for i in range(args.requests)]
+    elapsed, created = run_phase(url, creates, "/create_ticket",
+                                 "application/x-www-form-urlencoded", args.concurrency)
+    report("create", elapsed, created)
+
+    validates = [json.dumps({"qr_data": data["qr_data"]}) for _, data in created]
+    elapsed, validated = run_phase(url, validates, "/validate_ticket",
+                                   "application/json", args.concurrency)
+    report("validate", elapsed, validated)
+
+    accepted = sum(1 for _, data in validated if data.get("valid"))
+    print(f"{accepted}/{len(validated)} tickets accepted")
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
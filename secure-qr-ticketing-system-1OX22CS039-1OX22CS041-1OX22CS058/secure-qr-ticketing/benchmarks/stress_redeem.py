@@ -0,0 +1,69 @@
+"""Fire N concurrent validations of the same ticket and check only one wins.
+
+Runs the scans both directly against SecureTicketingSystem and through the
+Flask app served by a threaded Werkzeug server.
+
+Usage: python benchmarks/stress_redeem.py [concurrency] [rounds]
+"""
+
+import json
+import sys
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from common import load_main
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def hammer(validate, qr_data, concurrency):
+    barrier = threading.Barrier(concurrency)
+
+    def scan(_):
+        barrier.wait()
+        return validate(qr_data)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(scan, range(concurrency)))
+    return sum(1 for r in results if r["valid"])
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    Main, _ = load_main()
+    system = Main.ticketing_system
+
+    server = make_server("127.0.0.1", 0, Main.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/validate_ticket"
+
+    def validate_http(qr_data):
+        req = urllib.request.Request(url, data=json.dumps({"qr_data": qr_data}).encode(),
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req) as resp:
+            return json.load(resp)
+
+    failures = 0
+    for name, validate in (("direct", system.validate_ticket), ("http", validate_http)):
+        for _ in range(rounds):
+            qr_data = system.seal_ticket(system.create_ticket("Stress", "Guest", "A1")["ticket_data"])
+            accepted = hammer(validate, qr_data, concurrency)
+            if accepted != 1:
+                failures += 1
+                print(f"[{name}] FAIL: {accepted} of {concurrency} scans accepted")
+        print(f"[{name}] {rounds} rounds x {concurrency} concurrent scans done")
+
+    server.shutdown()
+    print("OK" if not failures else f"{failures} rounds double-redeemed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
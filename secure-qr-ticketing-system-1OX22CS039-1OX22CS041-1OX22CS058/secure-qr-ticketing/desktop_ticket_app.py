@@ -2,9 +2,20 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 import cv2
-from pyzbar import pyzbar
 import requests
 import json
+import os
+import queue
+import socket
+import threading
+import time
+from qr_scanner import QRScanner, decode_folder, list_images
+from gate_client import GateValidator, validate_bulk
+
+SCANNER_POLL_MS = 50      # how often Tk picks up scan results and preview frames
+STATS_INTERVAL_MS = 1000
+BATCH_POLL_MS = 100
+BATCH_COLUMNS = ("file", "status", "reason", "ticket_id", "decode")
 
 # =========================
 # App Configuration
@@ -16,7 +27,14 @@ class TicketDesktopApp:
         self.root.geometry("900x600")
         self.root.resizable(False, False)
         self.api_base = "http://localhost:5000"
+        self.gate_name = os.environ.get("TICKET_GATE_NAME") or socket.gethostname()
         self.dark_mode = False
+        self.scanner = None
+        self.gate = None
+        self.last_stats = 0
+        self.gate_counts = {"accepted": 0, "rejected": 0}
+        self.batch_queue = None
+        self.batch_cancel = threading.Event()
 
         # Colors
         self.light_bg = "#f0f0f0"
@@ -45,7 +63,9 @@ class TicketDesktopApp:
         
         buttons = [
             ("Scan QR", self.scan_qr),
+            ("Gate Mode", self.gate_mode),
             ("Upload Ticket", self.upload_ticket),
+            ("Validate Folder", self.validate_folder),
             ("Toggle Theme", self.toggle_theme),
             ("Exit", self.root.quit)
         ]
@@ -69,6 +89,15 @@ class TicketDesktopApp:
                                    bg=self.light_bg, fg=self.text_color)
         self.info_label.pack(pady=20)
 
+        self.stats_label = tk.Label(self.main_frame, text="", font=("Arial", 10),
+                                    bg=self.light_bg, fg=self.text_color)
+        self.stats_label.pack()
+
+        # Accept/reject banner for gate mode
+        self.result_label = tk.Label(self.main_frame, text="", font=("Arial", 18, "bold"),
+                                     bg=self.light_bg, fg="white")
+        self.result_label.pack(pady=5)
+
         # Placeholder for QR image preview
         self.img_label = tk.Label(self.main_frame, bg=self.light_bg)
         self.img_label.pack(pady=10)
@@ -83,27 +112,112 @@ class TicketDesktopApp:
         self.main_frame.configure(bg=bg)
         self.title_label.configure(bg=bg, fg=fg)
         self.info_label.configure(bg=bg, fg=fg)
+        self.stats_label.configure(bg=bg, fg=fg)
+        if not self.result_label.cget("text"):
+            self.result_label.configure(bg=bg)
+        self.img_label.configure(bg=bg)
 
     def scan_qr(self):
-        cap = cv2.VideoCapture(0)
-        self.info_label.config(text="Scanning QR code... Press 'q' to exit.")
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            decoded_objs = pyzbar.decode(frame)
-            for obj in decoded_objs:
-                qr_data = obj.data.decode("utf-8")
-                self.info_label.config(text=f"QR Data: {qr_data}")
-                cap.release()
-                cv2.destroyAllWindows()
-                return
-            cv2.imshow("QR Scanner - Press q to exit", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-        cap.release()
-        cv2.destroyAllWindows()
-        self.info_label.config(text="Scan cancelled or no QR found.")
+        # Capture and decode run on background threads; the GUI only polls
+        if self.scanner is not None:
+            self.stop_scanner("Scan cancelled.")
+            return
+        try:
+            self.scanner = QRScanner(0).start()
+        except RuntimeError as e:
+            self.scanner = None
+            messagebox.showerror("Camera Error", str(e))
+            return
+        self.info_label.config(text="Scanning QR code... Press 'Scan QR' again to stop.")
+        self.root.after(SCANNER_POLL_MS, self.poll_scanner)
+
+    def gate_mode(self):
+        # Keep the camera running and validate every new code with the server
+        if self.scanner is not None:
+            self.stop_scanner("Gate mode stopped.")
+            return
+        try:
+            self.scanner = QRScanner(0).start()
+        except RuntimeError as e:
+            self.scanner = None
+            messagebox.showerror("Camera Error", str(e))
+            return
+        self.gate = GateValidator(self.api_base, gate=self.gate_name)
+        self.gate_counts = {"accepted": 0, "rejected": 0}
+        self.info_label.config(text="Gate mode: show tickets to the camera. Press 'Gate Mode' again to stop.")
+        self.root.after(SCANNER_POLL_MS, self.poll_scanner)
+
+    def poll_scanner(self):
+        scanner = self.scanner
+        if scanner is None:
+            return
+        if self.gate is not None:
+            self.poll_gate(scanner)
+        elif not scanner.results.empty():
+            texts, frame = scanner.results.get()
+            self.show_frame(frame)
+            self.stop_scanner(f"QR Data: {texts[0]}")
+            return
+        if not scanner.running:
+            self.stop_scanner(scanner.error or "Scan cancelled or no QR found.")
+            return
+
+        self.show_frame(scanner.latest_frame())
+        now = time.monotonic()
+        if now - self.last_stats >= STATS_INTERVAL_MS / 1000:
+            self.last_stats = now
+            stats = scanner.stats()
+            self.stats_label.config(text=f"{stats['fps']:.1f} frames/s   "
+                                         f"{stats['decodes_per_second']:.1f} decodes/s   "
+                                         f"{stats['dropped']} stale frames dropped")
+        self.root.after(SCANNER_POLL_MS, self.poll_scanner)
+
+    def poll_gate(self, scanner):
+        while not scanner.results.empty():
+            texts, _ = scanner.results.get()
+            for qr_data in texts:
+                if self.gate.submit(qr_data):
+                    self.result_label.config(text="Checking...", bg="#888888")
+        while not self.gate.results.empty():
+            self.show_gate_result(self.gate.results.get())
+
+    def show_gate_result(self, result):
+        latency = f"{result['latency_ms']:.0f} ms"
+        if result["valid"]:
+            self.gate_counts["accepted"] += 1
+            ticket = result["ticket_data"] or {}
+            self.result_label.config(text=f"ACCEPTED ({latency})", bg="#2e8b57")
+            self.info_label.config(text=f"{ticket.get('holder_name', '')} - Seat {ticket.get('seat_number', '')}"
+                                        f" - {ticket.get('event_name', '')}")
+        elif result.get("unknown"):
+            # The server may have redeemed it; a rescan would only say "already used"
+            self.result_label.config(text=f"CHECK MANUALLY ({latency})", bg="#d68910")
+            self.info_label.config(text=result["reason"])
+        else:
+            self.gate_counts["rejected"] += 1
+            self.result_label.config(text=f"REJECTED ({latency})", bg="#c0392b")
+            self.info_label.config(text=result["reason"] or "Invalid ticket")
+        self.root.title(f"Secure Ticket Manager - {self.gate_counts['accepted']} accepted, "
+                        f"{self.gate_counts['rejected']} rejected")
+
+    def show_frame(self, frame):
+        if frame is None:
+            return
+        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        img.thumbnail((400, 300))
+        img = ImageTk.PhotoImage(img)
+        self.img_label.config(image=img)
+        self.img_label.image = img
+
+    def stop_scanner(self, message):
+        if self.scanner is not None:
+            self.scanner.stop()
+            self.scanner = None
+        if self.gate is not None:
+            self.gate.close()
+            self.gate = None
+            self.result_label.config(text="", bg=self.main_frame.cget("bg"))
+        self.info_label.config(text=message)
 
     def upload_ticket(self):
         file_path = filedialog.askopenfilename(title="Select Ticket Image")
@@ -117,10 +231,132 @@ class TicketDesktopApp:
         else:
             self.info_label.config(text="No file selected.")
 
+    # =========================
+    # Folder Validation
+    # =========================
+    def validate_folder(self):
+        if self.batch_queue is not None:
+            messagebox.showinfo("Validate Folder", "A folder is already being validated.")
+            return
+        folder = filedialog.askdirectory(title="Select Folder of Ticket Images")
+        if not folder:
+            self.info_label.config(text="No folder selected.")
+            return
+        paths = list_images(folder)
+        if not paths:
+            self.info_label.config(text="No ticket images found in that folder.")
+            return
+
+        self.open_batch_window(folder, len(paths))
+        self.batch_queue = queue.Queue()
+        self.batch_cancel.clear()
+        threading.Thread(target=self.run_folder_batch, args=(paths, self.batch_queue),
+                         daemon=True).start()
+        self.root.after(BATCH_POLL_MS, self.poll_batch)
+
+    def open_batch_window(self, folder, total):
+        self.batch_window = tk.Toplevel(self.root)
+        self.batch_window.title(f"Validate Folder - {folder}")
+        self.batch_window.geometry("900x500")
+        self.batch_window.protocol("WM_DELETE_WINDOW", self.close_batch_window)
+
+        self.batch_status = tk.Label(self.batch_window, text=f"Decoding {total} images...", font=("Arial", 12))
+        self.batch_status.pack(pady=5)
+        self.batch_progress = ttk.Progressbar(self.batch_window, maximum=total, length=850)
+        self.batch_progress.pack(pady=5)
+
+        table_frame = tk.Frame(self.batch_window)
+        table_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.batch_table = ttk.Treeview(table_frame, columns=BATCH_COLUMNS, show="headings")
+        widths = {"file": 220, "status": 90, "reason": 260, "ticket_id": 250, "decode": 80}
+        for column in BATCH_COLUMNS:
+            self.batch_table.heading(column, text=column.replace("_", " ").title(),
+                                     command=lambda c=column: self.sort_batch_table(c, False))
+            self.batch_table.column(column, width=widths[column], anchor="w")
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.batch_table.yview)
+        self.batch_table.configure(yscrollcommand=scrollbar.set)
+        self.batch_table.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+    def close_batch_window(self):
+        self.batch_cancel.set()
+        self.batch_window.destroy()
+
+    def sort_batch_table(self, column, reverse):
+        rows = [(self.batch_table.set(item, column), item) for item in self.batch_table.get_children("")]
+        rows.sort(key=lambda row: row[0].lower(), reverse=reverse)
+        for index, (_, item) in enumerate(rows):
+            self.batch_table.move(item, "", index)
+        # Clicking the same heading again flips the order
+        self.batch_table.heading(column, command=lambda: self.sort_batch_table(column, not reverse))
+
+    def run_folder_batch(self, paths, updates):
+        # Background thread: decode in a process pool, then validate in bulk
+        decoded = list(decode_folder(paths,
+                                     on_progress=lambda done, total: updates.put(("progress", done)),
+                                     cancelled=self.batch_cancel.is_set))
+        if self.batch_cancel.is_set():
+            updates.put(("done", None))
+            return
+
+        found = [r for r in decoded if r["codes"]]
+        updates.put(("status", f"Checking {len(found)} tickets with the server..."))
+        try:
+            # Check only: a folder check must not burn the tickets before the gate
+            verdicts = validate_bulk(self.api_base, [r["codes"][0] for r in found],
+                                     gate=self.gate_name, redeem=False)
+        except requests.RequestException as e:
+            verdicts = [{"valid": False, "reason": f"Server error: {e}", "ticket_id": None}] * len(found)
+        verdicts = dict(zip((r["path"] for r in found), verdicts))
+
+        rows = []
+        for result in decoded:
+            verdict = verdicts.get(result["path"])
+            if result["error"]:
+                status, reason = "ERROR", result["error"]
+            elif verdict is None:
+                status, reason = "NO QR", "No QR code found"
+            else:
+                status = "VALID" if verdict["valid"] else "REJECTED"
+                reason = verdict.get("reason") or ""
+            rows.append((os.path.basename(result["path"]), status, reason,
+                         (verdict or {}).get("ticket_id") or "", result["pass"] or ""))
+        updates.put(("done", rows))
+
+    def poll_batch(self):
+        updates = self.batch_queue
+        alive = self.batch_window.winfo_exists()
+        rows = False
+        while not updates.empty():
+            kind, value = updates.get()
+            if kind == "done":
+                rows = value
+            elif not alive:
+                continue
+            elif kind == "progress":
+                self.batch_progress["value"] = value
+            else:
+                self.batch_status.config(text=value)
+        if rows is False:
+            self.root.after(BATCH_POLL_MS, self.poll_batch)
+            return
+
+        self.batch_queue = None
+        if rows is None or not alive:
+            self.info_label.config(text="Folder validation cancelled.")
+            return
+        for row in rows:
+            self.batch_table.insert("", "end", values=row)
+        valid = sum(1 for row in rows if row[1] == "VALID")
+        summary = f"{valid} of {len(rows)} tickets valid"
+        self.batch_status.config(text=summary)
+        self.info_label.config(text=f"Folder validation: {summary}")
+
 # =========================
 # Run App
 # =========================
 if __name__ == "__main__":
+    # Guard needed: folder validation starts worker processes that import this module
     root = tk.Tk()
     app = TicketDesktopApp(root)
     root.mainloop()
@@ -0,0 +1,139 @@
+# Server validation for the desktop app's continuous gate mode
+#
+# Decoded QR strings are de-duplicated (the camera sees the same code on
+# many consecutive frames) and queued for a small pool of background
+# workers, which POST them to /validate_ticket over one keep-alive
+# requests.Session. Results are collected on a queue for the GUI thread.
+
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def make_session(pool_size=4):
+    """requests.Session with a keep-alive pool sized for the worker threads.
+
+    Only connection failures are retried: a validation request that reached
+    the server may already have redeemed the ticket.
+    """
+    session = requests.Session()
+    retry = Retry(total=2, connect=2, read=0, status=0, other=0,
+                  allowed_methods=None, backoff_factor=0.1)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def validate_bulk(api_base, codes, session=None, timeout=60.0, gate=None, redeem=True):
+    """Validate many QR strings in one /validate_tickets_stream request.
+
+    Returns one {"valid", "reason", "ticket_id"} dict per code, in order.
+    gate names this device in the server's redemption log. With
+    redeem=False the server only checks the tickets and marks none used.
+    """
+    session = session or make_session(1)
+    body = "".join(json.dumps({"qr_data": qr_data, "gate": gate}) + "\n" for qr_data in codes)
+    results = [None] * len(codes)
+    with session.post(api_base.rstrip("/") + "/validate_tickets_stream", data=body.encode(),
+                      params=None if redeem else {"redeem": "0"},
+                      headers={"Content-Type": "application/x-ndjson"},
+                      stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                result = json.loads(line)
+                results[result["line"] - 1] = result
+    return [r or {"valid": False, "reason": "No result from server", "ticket_id": None} for r in results]
+
+
+class GateValidator:
+    """Background validation of scanned tickets against the server.
+
+    submit() returns immediately; each result lands on self.results as a
+    dict with qr_data, valid, reason, ticket_data, unknown and latency_ms.
+    unknown is True when the request may have reached the server (read
+    timeout, server error): the ticket could already be redeemed, so the
+    gate should check it by hand instead of rescanning.
+    """
+
+    def __init__(self, api_base, workers=2, dedup_seconds=10.0, timeout=5.0, session=None, gate=None):
+        self.url = api_base.rstrip("/") + "/validate_ticket"
+        self.gate = gate  # device name recorded in the server's redemption log
+        self.timeout = timeout
+        self.dedup_seconds = dedup_seconds
+        self.session = session or make_session(workers)
+        self.pending = queue.Queue()
+        self.results = queue.Queue()
+        self.duplicates = 0
+        self._seen = OrderedDict()  # qr_data -> last submit time
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._worker, name=f"gate-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, qr_data):
+        """Queue a scan for validation. Returns False if it is a repeat read"""
+        now = time.monotonic()
+        with self._lock:
+            # Forget codes that left the de-duplication window
+            while self._seen and next(iter(self._seen.values())) < now - self.dedup_seconds:
+                self._seen.popitem(last=False)
+            if qr_data in self._seen:
+                # Still in front of the camera: keep it suppressed
+                self._seen.move_to_end(qr_data)
+                self._seen[qr_data] = now
+                self.duplicates += 1
+                return False
+            self._seen[qr_data] = now
+        self.pending.put(qr_data)
+        return True
+
+    def validate(self, qr_data):
+        """Validate one scan synchronously"""
+        start = time.perf_counter()
+        unknown = False
+        try:
+            response = self.session.post(self.url, json={"qr_data": qr_data, "gate": self.gate},
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+        except requests.ConnectionError as e:
+            # Never reached the server (includes ConnectTimeout): let the next read try again
+            result = {"valid": False, "reason": f"Server unreachable: {e}"}
+            with self._lock:
+                self._seen.pop(qr_data, None)
+        except (requests.RequestException, ValueError) as e:
+            # ReadTimeout and the like: the scan may have been redeemed, so keep
+            # suppressing repeat reads rather than re-posting it as "already used"
+            result = {"valid": False, "reason": f"Outcome unknown: {e}"}
+            unknown = True
+        return {
+            "qr_data": qr_data,
+            "valid": bool(result.get("valid")),
+            "reason": result.get("reason"),
+            "ticket_data": result.get("ticket_data"),
+            "unknown": unknown,
+            "latency_ms": (time.perf_counter() - start) * 1000
+        }
+
+    def close(self):
+        for _ in self._threads:
+            self.pending.put(None)
+        for thread in self._threads:
+            thread.join(timeout=self.timeout)
+        self.session.close()
+
+    def _worker(self):
+        while True:
+            qr_data = self.pending.get()
+            if qr_data is None:
+                return
+            self.results.put(self.validate(qr_data))
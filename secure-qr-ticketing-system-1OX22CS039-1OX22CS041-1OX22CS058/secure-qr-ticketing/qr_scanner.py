@@ -0,0 +1,233 @@
+# Camera capture and QR decode pipeline for the desktop app
+#
+#   capture thread   cap.read() as fast as the camera delivers, keeping
+#                    only the newest frame (stale frames are dropped)
+#   decode thread    grayscale -> crop to the centre ROI -> downscale ->
+#                    pyzbar, then hands results to the consumer
+#
+# Nothing here touches Tk: results and preview frames are picked up by the
+# GUI thread (see TicketDesktopApp.poll_scanner), which keeps Tk calls on
+# the main thread.
+#
+# decode_folder does the same decoding for a directory of ticket images,
+# spread over a process pool.
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+from pyzbar import pyzbar
+
+DECODE_WIDTH = 640
+SCAN_ROI = 0.8
+IMAGE_DECODE_WIDTH = 1000
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp", ".tif", ".tiff")
+
+
+def prepare_frame(frame, max_width=DECODE_WIDTH, roi=SCAN_ROI):
+    """Grayscale, crop to the central roi fraction and downscale to max_width"""
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if roi < 1.0:
+        height, width = gray.shape
+        crop_h, crop_w = int(height * roi), int(width * roi)
+        top, left = (height - crop_h) // 2, (width - crop_w) // 2
+        gray = gray[top:top + crop_h, left:left + crop_w]
+    height, width = gray.shape
+    if max_width and width > max_width:
+        gray = cv2.resize(gray, (max_width, height * max_width // width), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def decode_qr(image):
+    """Decode QR codes (only) in an image, returning their text"""
+    return [obj.data.decode("utf-8") for obj in pyzbar.decode(image, symbols=[pyzbar.ZBarSymbol.QRCODE])]
+
+
+class RateCounter:
+    """Events per second since the previous read"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.since = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, n=1):
+        with self.lock:
+            self.count += n
+            self.total += n
+
+    def rate(self):
+        with self.lock:
+            now = time.perf_counter()
+            rate = self.count / (now - self.since) if now > self.since else 0.0
+            self.count = 0
+            self.since = now
+        return rate
+
+
+class QRScanner:
+    """Threaded capture + decode pipeline.
+
+    Decoded codes are put on self.results as (texts, frame) tuples; the
+    newest raw frame is available from latest_frame() for a preview.
+    """
+
+    def __init__(self, source=0, max_width=DECODE_WIDTH, roi=SCAN_ROI, decode=decode_qr):
+        self.source = source
+        self.max_width = max_width
+        self.roi = roi
+        self.decode = decode
+        self.results = queue.Queue()
+        self.frames = RateCounter()
+        self.decodes = RateCounter()
+        self.dropped = 0
+        self.error = None
+        self._frame = None
+        self._preview = None
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._cap = None
+
+    def start(self):
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Cannot open camera {self.source}")
+        # Ask the driver not to queue old frames behind our back
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="qr-capture", daemon=True),
+            threading.Thread(target=self._decode_loop, name="qr-decode", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    @property
+    def running(self):
+        return not self._stopped.is_set() and any(t.is_alive() for t in self._threads)
+
+    def latest_frame(self):
+        """Most recent captured frame (BGR), or None"""
+        return self._preview
+
+    def stats(self):
+        return {
+            "fps": self.frames.rate(),
+            "decodes_per_second": self.decodes.rate(),
+            "frames": self.frames.total,
+            "decoded_frames": self.decodes.total,
+            "dropped": self.dropped,
+        }
+
+    def _capture_loop(self):
+        try:
+            while not self._stopped.is_set():
+                ok, frame = self._cap.read()
+                if not ok:
+                    self.error = "Camera stopped delivering frames"
+                    break
+                self.frames.add()
+                self._preview = frame
+                with self._cond:
+                    if self._frame is not None:
+                        self.dropped += 1
+                    self._frame = frame
+                    self._cond.notify()
+        finally:
+            self._stopped.set()
+            with self._cond:
+                self._cond.notify_all()
+
+    def _decode_loop(self):
+        while True:
+            with self._cond:
+                while self._frame is None and not self._stopped.is_set():
+                    self._cond.wait()
+                if self._frame is None:
+                    return
+                frame, self._frame = self._frame, None
+            try:
+                texts = self.decode(prepare_frame(frame, self.max_width, self.roi))
+            except Exception as e:
+                self.error = f"Decode failed: {e}"
+                self._stopped.set()
+                return
+            self.decodes.add()
+            if texts:
+                self.results.put((texts, frame))
+
+
+def load_gray(path):
+    """Read an image file as 8-bit grayscale"""
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        # OpenCV cannot read GIFs (and some other files Pillow can)
+        with Image.open(path) as img:
+            image = np.asarray(img.convert("L"))
+    return image
+
+
+def decode_image_file(path, max_width=IMAGE_DECODE_WIDTH):
+    """Decode the QR codes in one ticket image.
+
+    Tries a downscaled copy first, which is enough for almost every
+    emailed ticket, and retries at full resolution if nothing was found.
+    Returns {"path", "codes", "pass", "error"}; pass is "downscaled",
+    "fullres" or None.
+    """
+    try:
+        image = load_gray(path)
+        codes = decode_qr(prepare_frame(image, max_width, roi=1.0))
+        if codes:
+            return {"path": path, "codes": codes, "pass": "downscaled", "error": None}
+        if image.shape[1] > max_width:
+            codes = decode_qr(image)
+            if codes:
+                return {"path": path, "codes": codes, "pass": "fullres", "error": None}
+        return {"path": path, "codes": [], "pass": None, "error": None}
+    except Exception as e:
+        return {"path": path, "codes": [], "pass": None, "error": str(e)}
+
+
+def list_images(folder):
+    """Image files directly inside folder, sorted by name"""
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def decode_folder(paths, workers=None, on_progress=None, cancelled=None):
+    """Decode many image files in a process pool.
+
+    Yields decode_image_file results in input order. on_progress(done,
+    total) is called as results come in; cancelled() is checked between
+    results to stop early.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(16, len(paths) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, result in enumerate(pool.map(decode_image_file, paths, chunksize=chunksize), 1):
+            if on_progress:
+                on_progress(done, len(paths))
+            yield result
+            if cancelled and cancelled():
+                pool.shutdown(wait=False, cancel_futures=True)
+                return
@@ -0,0 +1,208 @@
+# Offline redemption index for gate scanners
+#
+# The server exports a compact snapshot of the tickets table which gate
+# devices memory-map and validate against without touching tickets.db.
+#
+# File layout:
+#   header   magic "TKIX" | version | count | generated_at (epoch seconds)
+#   ids      count x 16-byte ticket UUIDs, sorted
+#   bitmap   ceil(count / 8) bytes, bit i set = ticket i already redeemed
+#
+# Local redemptions are flipped in the mapped bitmap (copy-on-write, the
+# file itself is never modified) and appended to a journal file, which is
+# synced back to the server in bulk with SecureTicketingSystem.sync_redemptions.
+#
+# Both ends of that exchange need gate credentials: every gate has its own
+# secret key (a JSON file {"gate name": "hex key"} on the server). Requests
+# carry X-Gate, X-Gate-Time and an HMAC of the request under the gate's key
+# (gate_auth_headers), and every journal entry is signed with it too, so
+# the server only applies redemptions a known gate actually recorded.
+
+import bisect
+import hashlib
+import hmac
+import json
+import mmap
+import os
+import struct
+import time
+import uuid
+from datetime import datetime
+
+INDEX_MAGIC = b"TKIX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct(">4sBxxxIQ")
+ID_SIZE = 16
+GATE_AUTH_WINDOW = 300  # seconds a signed request stays acceptable
+
+
+def build_index(rows):
+    """Serialize (ticket_id, used) rows into the index format"""
+    entries = sorted((uuid.UUID(ticket_id).bytes, bool(used)) for ticket_id, used in rows)
+    bitmap = bytearray((len(entries) + 7) // 8)
+    for i, (_, used) in enumerate(entries):
+        if used:
+            bitmap[i >> 3] |= 1 << (i & 7)
+
+    header = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(entries), int(time.time()))
+    return header + b"".join(ticket_bytes for ticket_bytes, _ in entries) + bytes(bitmap)
+
+
+def write_index(path, rows):
+    """Atomically write an index file from (ticket_id, used) rows"""
+    data = build_index(rows)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_gate_keys(path):
+    """{gate name: key bytes} from a JSON file of hex keys"""
+    with open(path) as f:
+        return {gate: bytes.fromhex(key) for gate, key in json.load(f).items()}
+
+
+def entry_signature(key, entry):
+    """HMAC of one journal entry (ticket_id, use_time, gate)"""
+    message = json.dumps([entry["ticket_id"], entry["use_time"], entry.get("gate")],
+                         separators=(",", ":"))
+    return hmac.new(key, message.encode(), hashlib.sha256).hexdigest()
+
+
+def request_signature(key, gate, timestamp, method, path, query=""):
+    message = "\n".join((method.upper(), path, query, gate, str(timestamp)))
+    return hmac.new(key, message.encode(), hashlib.sha256).hexdigest()
+
+
+def gate_auth_headers(key, gate, method, path, query=""):
+    """Headers authenticating one request to /redemption_index or /sync_redemptions"""
+    timestamp = int(time.time())
+    return {"X-Gate": gate, "X-Gate-Time": str(timestamp),
+            "X-Gate-Signature": request_signature(key, gate, timestamp, method, path, query)}
+
+
+def verify_gate_request(gate_keys, headers, method, path, query=""):
+    """Name of the gate that signed the request, or None"""
+    gate = headers.get("X-Gate")
+    key = gate_keys.get(gate) if gate else None
+    try:
+        timestamp = int(headers.get("X-Gate-Time", ""))
+    except ValueError:
+        return None
+    if key is None or abs(time.time() - timestamp) > GATE_AUTH_WINDOW:
+        return None
+    expected = request_signature(key, gate, timestamp, method, path, query)
+    if not hmac.compare_digest(expected, headers.get("X-Gate-Signature", "")):
+        return None
+    return gate
+
+
+class _IdView:
+    """Sequence view over the sorted id block so bisect can search the mmap"""
+
+    def __init__(self, mm, count):
+        self.mm = mm
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = INDEX_HEADER.size + i * ID_SIZE
+        return self.mm[start:start + ID_SIZE]
+
+
+class RedemptionIndex:
+    """Memory-mapped, read-mostly view of an exported redemption index"""
+
+    def __init__(self, path, journal_path=None, gate=None, gate_key=None):
+        self.path = path
+        self.journal_path = journal_path or path + ".journal"
+        self.gate = gate
+        self.gate_key = gate_key  # signs journal entries for sync_redemptions
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        magic, version, count, generated_at = INDEX_HEADER.unpack_from(self._mm)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError("Not a redemption index file")
+        self.count = count
+        self.generated_at = generated_at
+        self._ids = _IdView(self._mm, count)
+        self._bitmap_offset = INDEX_HEADER.size + count * ID_SIZE
+
+        # Re-apply redemptions made on this device since the index was exported
+        self._repair_journal()
+        for entry in self.journal_entries():
+            position = self.lookup(entry["ticket_id"])
+            if position >= 0:
+                self._set_redeemed(position)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def lookup(self, ticket_id):
+        """Return the position of ticket_id in the index, or -1"""
+        key = uuid.UUID(ticket_id).bytes
+        i = bisect.bisect_left(self._ids, key)
+        if i < self.count and self._ids[i] == key:
+            return i
+        return -1
+
+    def _is_redeemed(self, position):
+        return bool(self._mm[self._bitmap_offset + (position >> 3)] & (1 << (position & 7)))
+
+    def _set_redeemed(self, position):
+        offset = self._bitmap_offset + (position >> 3)
+        self._mm[offset] = self._mm[offset] | (1 << (position & 7))
+
+    def is_redeemed(self, ticket_id):
+        position = self.lookup(ticket_id)
+        return position >= 0 and self._is_redeemed(position)
+
+    def redeem(self, ticket_id, gate=None):
+        """Redeem a ticket locally and journal it. Returns (redeemed, reason)"""
+        position = self.lookup(ticket_id)
+        if position < 0:
+            return False, "Ticket not found in offline index"
+        if self._is_redeemed(position):
+            return False, "Ticket already used"
+
+        self._set_redeemed(position)
+        entry = {"ticket_id": ticket_id, "use_time": datetime.now().isoformat(), "gate": gate or self.gate}
+        if self.gate_key is not None:
+            entry["sig"] = entry_signature(self.gate_key, entry)
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return True, None
+
+    def _repair_journal(self):
+        """Drop a torn final line left by a crash during an append.
+
+        redeem() only returns after the fsync, so a line without its
+        newline was never reported as redeemed to the gate.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r+b") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def journal_entries(self):
+        """Redemptions recorded on this device that still need syncing"""
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path) as f:
+            # An incomplete last line is an append still in progress (or torn)
+            return [json.loads(line) for line in f if line.strip() and line.endswith("\n")]
+
+    def clear_journal(self):
+        """Forget journaled redemptions once the server has accepted them"""
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
@@ -0,0 +1,320 @@
+# Tamper-evident, append-only log of ticket scans
+#
+# One JSON record per line:
+#   {"seq", "ts", "ticket_id", "gate", "outcome", "reason", "prev", "hash"}
+# where hash = sha256(prev + canonical JSON of the other fields) and prev is
+# the hash of the record before it (GENESIS_HASH for the first one). Editing,
+# dropping or reordering any record breaks every hash after it.
+#
+# Appends use group commit: callers queue records and a writer thread
+# writes whatever has accumulated with a single fsync, then wakes every
+# caller in the group. Scans arriving during an fsync form the next group,
+# so the fsync time itself is the batching window. On storage where fsync
+# is very cheap, commit_window makes the writer wait that much longer for
+# company, but only while scans are arriving concurrently (the last group
+# had more than one record). Each group is
+# written under an exclusive flock, and the writer re-reads the tail when
+# another process appended in between, so gunicorn workers can share one
+# chain.
+#
+# The log is the audit trail for tickets.used: replay() rebuilds the
+# redemption state of a ticket database from it.
+#
+#   python redemption_log.py verify redemptions.log
+#   python redemption_log.py replay redemptions.log --db tickets.db [--reset]
+#   python redemption_log.py replay redemptions.log --db tickets.shard0.db --db tickets.shard1.db
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process servers only (waitress)
+    fcntl = None
+
+GENESIS_HASH = "0" * 64
+TAIL_READ_SIZE = 8192
+
+_restart_lock = threading.Lock()
+
+
+class LogCorrupted(ValueError):
+    """The hash chain is broken (the log was edited or damaged)"""
+
+
+def record_hash(prev_hash, body):
+    """Chain hash of one record; body excludes "hash" itself"""
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256((prev_hash + canonical).encode()).hexdigest()
+
+
+class RedemptionLog:
+    """Hash-chained scan log with group-committed fsyncs.
+
+    append() blocks until the record is on disk unless wait=False, which
+    suits rejected scans: they are audited but nothing depends on them
+    being durable before the gate gets its answer.
+    """
+
+    def __init__(self, path="redemptions.log", commit_window=0.0, max_batch=1024, fsync=True):
+        self.path = path
+        self.commit_window = commit_window
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.commits = 0
+        self.records = 0
+        self._start()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._pending = []
+        self._queued = 0    # records handed to this process's writer
+        self._written = 0   # ...of which are on disk
+        self._closed = False
+        self._error = None
+        self._file = open(self.path, "a+b")
+        self._end = None    # file size after our last write
+        self._last_group = 0
+        self._last_seq, self._last_hash = 0, GENESIS_HASH
+        self._writer = threading.Thread(target=self._write_loop, name="redemption-log", daemon=True)
+        self._writer.start()
+
+    def append(self, ticket_id, outcome, gate=None, reason=None, ts=None, wait=True):
+        """Log one scan; returns once it is durable (if wait)"""
+        return self.append_many([(ticket_id, outcome, gate, reason, ts)], wait)
+
+    def append_many(self, scans, wait=True):
+        """Log (ticket_id, outcome, gate, reason, ts) tuples as one group"""
+        if self._pid != os.getpid():
+            # The writer thread does not survive fork (gunicorn --preload)
+            with _restart_lock:
+                if self._pid != os.getpid():
+                    self._start()
+        now = time.time()
+        records = [{"ts": round(ts if ts is not None else now, 6), "ticket_id": ticket_id,
+                    "gate": gate, "outcome": outcome, "reason": reason}
+                   for ticket_id, outcome, gate, reason, ts in scans]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Redemption log is closed")
+            if self._error:
+                raise self._error
+            self._pending.extend(records)
+            self._queued += len(records)
+            target = self._queued
+            self._cond.notify_all()
+            while wait and self._written < target and self._error is None:
+                self._cond.wait()
+            if wait and self._written < target:
+                raise self._error
+        return len(records)
+
+    def close(self):
+        """Write out everything queued, then stop the writer"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+
+    def stats(self):
+        return {
+            "records": self.records,
+            "commits": self.commits,
+            "records_per_commit": round(self.records / self.commits, 2) if self.commits else 0.0,
+            "last_seq": self._last_seq,
+        }
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Under concurrent load, let more scans join this group; a
+                # lone scanner would only pay the window as extra latency
+                deadline = time.monotonic() + self.commit_window
+                while (self._last_group > 1 and len(self._pending) < self.max_batch
+                       and not self._closed):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                group = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self._last_group = len(group)
+            try:
+                self._commit(group)
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._written += len(group)
+                self._cond.notify_all()
+
+    def _commit(self, group):
+        f = self._file
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size != self._end:
+                # First write, or another process appended since our last one
+                self._last_seq, self._last_hash = read_tail(f, size)
+            lines = []
+            for body in group:
+                body["seq"] = self._last_seq + 1
+                body["prev"] = self._last_hash
+                body["hash"] = record_hash(self._last_hash, body)
+                self._last_seq, self._last_hash = body["seq"], body["hash"]
+                lines.append(json.dumps(body, sort_keys=True, separators=(",", ":")) + "\n")
+            f.seek(0, os.SEEK_END)
+            f.write("".join(lines).encode())
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            self._end = f.tell()
+            self.commits += 1
+            self.records += len(group)
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_tail(f, size):
+    """(seq, hash) of the last complete record, dropping a torn final line.
+
+    A line without its newline was cut short by a crash before its fsync
+    returned, so no caller was ever told it was written.
+    """
+    start = max(0, size - TAIL_READ_SIZE)
+    f.seek(start)
+    data = f.read(size - start)
+    if data and not data.endswith(b"\n"):
+        cut = data.rfind(b"\n") + 1
+        f.truncate(start + cut)
+        data = data[:cut]
+    lines = data.splitlines()
+    if not lines or (start > 0 and len(lines) == 1):
+        if start > 0:
+            raise LogCorrupted("Last record does not fit in the tail buffer")
+        return 0, GENESIS_HASH
+    last = json.loads(lines[-1])
+    return last["seq"], last["hash"]
+
+
+def read_records(path):
+    """Yield every record in order, raising LogCorrupted at the first bad one"""
+    prev_hash, seq = GENESIS_HASH, 0
+    with open(path, "rb") as f:
+        for line_no, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise LogCorrupted(f"Line {line_no}: not a JSON record")
+            body = {k: v for k, v in record.items() if k != "hash"}
+            if record.get("seq") != seq + 1:
+                raise LogCorrupted(f"Line {line_no}: expected seq {seq + 1}, found {record.get('seq')}")
+            if record.get("prev") != prev_hash or record_hash(prev_hash, body) != record.get("hash"):
+                raise LogCorrupted(f"Line {line_no}: hash chain broken at seq {record.get('seq')}")
+            prev_hash, seq = record["hash"], record["seq"]
+            yield record
+
+
+def verify(path):
+    """Check the whole chain. Returns a summary dict with ok and error"""
+    count, last, outcomes = 0, None, {}
+    try:
+        for record in read_records(path):
+            count += 1
+            last = record
+            outcomes[record["outcome"]] = outcomes.get(record["outcome"], 0) + 1
+    except LogCorrupted as e:
+        return {"ok": False, "records": count, "error": str(e)}
+    return {"ok": True, "records": count, "outcomes": outcomes,
+            "last_seq": last["seq"] if last else 0,
+            "last_hash": last["hash"] if last else GENESIS_HASH}
+
+
+def replay(log_path, db_paths, reset=False):
+    """Rebuild tickets.used from the log's successful redemptions.
+
+    The whole chain is verified first; a broken log is never applied.
+    With reset, every ticket is marked unused before replaying, so the
+    database ends up exactly as the log describes it; without it the log
+    only fills in redemptions the database is missing. db_paths may list
+    every shard of a sharded store; each redemption goes to whichever
+    shard has the ticket, all in one transaction per shard.
+    """
+    if isinstance(db_paths, str):
+        db_paths = [db_paths]
+    redemptions = [r for r in read_records(log_path) if r["outcome"] == "valid"]
+    applied = already_used = missing = 0
+    conns = [sqlite3.connect(path) for path in db_paths]
+    try:
+        for conn in conns:
+            conn.execute('BEGIN')
+            if reset:
+                conn.execute('UPDATE tickets SET used = 0, use_time = NULL, use_ts = NULL')
+        for record in redemptions:
+            params = (datetime.fromtimestamp(record["ts"]).isoformat(), int(record["ts"]),
+                      record["ticket_id"])
+            for conn in conns:
+                cursor = conn.execute('''
+                    UPDATE tickets SET used = 1, use_time = ?, use_ts = ?
+                        WHERE ticket_id = ? AND used = 0
+                ''', params)
+                if cursor.rowcount == 1:
+                    applied += 1
+                    break
+                if conn.execute('SELECT 1 FROM tickets WHERE ticket_id = ?',
+                                (record["ticket_id"],)).fetchone():
+                    already_used += 1
+                    break
+            else:
+                missing += 1  # unknown here, or archived by the expiry sweeper
+        for conn in conns:
+            conn.commit()
+    finally:
+        for conn in conns:
+            conn.close()
+    return {"redemptions": len(redemptions), "applied": applied,
+            "already_used": already_used, "missing": missing}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or replay a ticket redemption log")
+    commands = parser.add_subparsers(dest="command", required=True)
+    verify_parser = commands.add_parser("verify", help="check the hash chain")
+    verify_parser.add_argument("log")
+    replay_parser = commands.add_parser("replay", help="rebuild tickets.used from the log")
+    replay_parser.add_argument("log")
+    replay_parser.add_argument("--db", action="append",
+                               help="ticket database; repeat once per shard (default tickets.db)")
+    replay_parser.add_argument("--reset", action="store_true",
+                               help="mark every ticket unused before replaying")
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        result = verify(args.log)
+        print(json.dumps(result, indent=2))
+        raise SystemExit(0 if result["ok"] else 1)
+    try:
+        print(json.dumps(replay(args.log, args.db or ["tickets.db"], args.reset), indent=2))
+    except LogCorrupted as e:
+        print(f"Refusing to replay: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
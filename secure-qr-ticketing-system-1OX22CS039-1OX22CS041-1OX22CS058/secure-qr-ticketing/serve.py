@@ -0,0 +1,78 @@
+# Production launcher for the Secure QR Ticketing System
+#
+#   python serve.py --server gunicorn --workers 4 --threads 8    (Linux/macOS, multi-process WSGI)
+#   python serve.py --server waitress --threads 16               (Windows friendly, threaded WSGI)
+#   python serve.py --server uvicorn --workers 4 --threads 16    (ASGI, crypto on a thread pool)
+#
+# Extra dependency per server: pip install gunicorn | waitress | uvicorn
+# Settings are read from TICKET_DB_PATH, TICKET_DB_SHARDS, TICKET_SHARD_BY,
+# TICKET_SIGNATURE_SCHEME and TICKET_QR_MODE, the same as the development server.
+
+import argparse
+import os
+
+from Main import create_app
+
+
+def prepare():
+    """Create the schema and key files once, before any worker starts"""
+    app = create_app()
+    app.extensions["ticketing_system"].shards.close_all()
+    return app
+
+
+def serve_gunicorn(app, args):
+    from gunicorn.app.base import BaseApplication
+
+    class TicketingApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread")
+            # The app (keys, schema) is built once in the master and forked;
+            # TicketDatabase opens fresh connections in every worker.
+            self.cfg.set("preload_app", True)
+
+        def load(self):
+            return app
+
+    TicketingApplication().run()
+
+
+def serve_waitress(app, args):
+    from waitress import serve
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+def serve_uvicorn(app, args):
+    import uvicorn
+    os.environ["TICKET_THREADS"] = str(args.threads)
+    uvicorn.run("asgi:app", host=args.host, port=args.port, workers=args.workers,
+                log_level="warning")
+
+
+SERVERS = {
+    "gunicorn": serve_gunicorn,
+    "waitress": serve_waitress,
+    "uvicorn": serve_uvicorn,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ticketing service in production mode")
+    parser.add_argument("--server", choices=SERVERS, default="waitress" if os.name == "nt" else "gunicorn")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (ignored by waitress)")
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker")
+    args = parser.parse_args()
+
+    app = prepare()
+    print(f"🎫 Secure QR Ticketing System ({args.server}) on http://{args.host}:{args.port}")
+    SERVERS[args.server](app, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# Copy a ticket store into a new shard layout
+#
+# Reads every event, ticket and archived ticket from the source files and
+# writes each row to the shard TicketShards would route it to, so the
+# server can then run with TICKET_DB_SHARDS / TICKET_SHARD_BY set to the
+# new layout. The source is opened read-only and never modified; the
+# target files must not hold tickets yet. Stop the server (or at least
+# ticket sales) while copying, then swap TICKET_DB_PATH over.
+#
+# Sharding only pays off when writes contend: with synchronous=FULL and
+# about 4 or more events scanning during a big sale
+# (benchmarks/bench_shards.py). Below that a single file is as fast or
+# faster, so the layout, shard key included, is always chosen explicitly.
+#
+#   python shard_tickets.py --source tickets.db --target sharded/tickets.db --shards 4 --by event
+#   python shard_tickets.py --source sharded/tickets.db --source-shards 4 \
+#       --target resharded/tickets.db --shards 8 --by ticket
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from Main import SCHEMA_VERSION, SHARD_KEYS, check_shard_layout, init_schema, shard_index, shard_paths
+
+TICKET_COLUMNS = ("ticket_id, event_name, issue_time, expiry_time, used, use_time, "
+                  "qr_data, issue_ts, expiry_ts, use_ts")
+TABLES = {
+    "tickets": TICKET_COLUMNS,
+    "tickets_archive": TICKET_COLUMNS + ", archived_ts",
+}
+BATCH_SIZE = 5000
+
+
+def open_source(path):
+    if not os.path.exists(path):
+        raise SystemExit(f"Source {path} does not exist")
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version < SCHEMA_VERSION:
+        raise SystemExit(f"{path} has schema version {version}; start the server on it once "
+                         f"to upgrade it to version {SCHEMA_VERSION} first")
+    return conn
+
+
+def open_targets(paths, count, shard_by, source_paths):
+    conns = []
+    for index, path in enumerate(paths):
+        if os.path.abspath(path) in map(os.path.abspath, source_paths):
+            raise SystemExit(f"Target {path} is also a source file")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        init_schema(conn)
+        if count > 1:
+            check_shard_layout(conn, path, {"shard": str(index), "shard_count": str(count),
+                                            "shard_by": shard_by})
+        if conn.execute('SELECT EXISTS (SELECT 1 FROM tickets UNION ALL '
+                        'SELECT 1 FROM tickets_archive)').fetchone()[0]:
+            raise SystemExit(f"Target {path} already holds tickets")
+        conns.append(conn)
+    return conns
+
+
+def route(row, count, shard_by):
+    """Shard index for a ticket row (ticket_id, event_name, ...)"""
+    return shard_index(row[0] if shard_by == "ticket" else row[1], count)
+
+
+def copy_store(sources, targets, shard_by, batch_size=BATCH_SIZE):
+    """Copy every row from the source connections; returns rows written per shard"""
+    count = len(targets)
+    written = [{"events": 0, "tickets": 0, "tickets_archive": 0} for _ in targets]
+    for source in sources:
+        # Events go to the event's shard, keeping the earliest creation time
+        for event_name, created_ts in source.execute('SELECT event_name, created_ts FROM events'):
+            index = shard_index(event_name, count)
+            with targets[index] as conn:
+                conn.execute('''
+                    INSERT INTO events (event_name, created_ts) VALUES (?, ?)
+                        ON CONFLICT (event_name) DO UPDATE SET
+                            created_ts = MIN(COALESCE(created_ts, excluded.created_ts),
+                                             COALESCE(excluded.created_ts, created_ts))
+                ''', (event_name, created_ts))
+        for table, columns in TABLES.items():
+            placeholders = ", ".join("?" * len(columns.split(", ")))
+            cursor = source.execute(f'SELECT {columns} FROM {table}')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                groups = {}
+                for row in rows:
+                    groups.setdefault(route(row, count, shard_by), []).append(row)
+                for index, group in groups.items():
+                    with targets[index] as conn:
+                        conn.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', group)
+                    written[index][table] += len(group)
+    for index, conn in enumerate(targets):
+        written[index]["events"] = conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+    return written
+
+
+def table_counts(conns):
+    """Distinct events plus ticket and archive rows over a set of files"""
+    names = set()
+    tickets = archived = 0
+    for conn in conns:
+        names.update(row[0] for row in conn.execute('SELECT event_name FROM events'))
+        tickets += conn.execute('SELECT COUNT(*) FROM tickets').fetchone()[0]
+        archived += conn.execute('SELECT COUNT(*) FROM tickets_archive').fetchone()[0]
+    return {"events": len(names), "tickets": tickets, "tickets_archive": archived}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy a ticket store into a new shard layout")
+    parser.add_argument("--source", default="tickets.db", help="source TICKET_DB_PATH")
+    parser.add_argument("--source-shards", type=int, default=1,
+                        help="TICKET_DB_SHARDS of the source (default 1)")
+    parser.add_argument("--target", required=True, help="TICKET_DB_PATH for the new layout")
+    parser.add_argument("--shards", type=int, required=True, help="number of target shards")
+    parser.add_argument("--by", choices=SHARD_KEYS, required=True,
+                        help="shard key: event name or ticket id")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    if args.shards < 1 or args.source_shards < 1:
+        parser.error("shard counts must be at least 1")
+
+    source_paths = shard_paths(args.source, args.source_shards)
+    target_paths = shard_paths(args.target, args.shards)
+    sources = [open_source(path) for path in source_paths]
+    targets = open_targets(target_paths, args.shards, args.by, source_paths)
+    try:
+        start = time.perf_counter()
+        written = copy_store(sources, targets, args.by, args.batch_size)
+        expected, copied = table_counts(sources), table_counts(targets)
+        if copied != expected:
+            raise SystemExit(f"Row counts differ after copying: source {expected}, target {copied}")
+        print(json.dumps({
+            "seconds": round(time.perf_counter() - start, 2),
+            "copied": copied,
+            "shards": [{"path": path, **rows} for path, rows in zip(target_paths, written)],
+        }, indent=2))
+    finally:
+        for conn in sources + targets:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()